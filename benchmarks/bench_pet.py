@@ -0,0 +1,261 @@
+"""桌宠动画与渲染热路径的无界面基准测试
+
+在 Qt 的 offscreen 平台插件下运行 PixelPet 和 AnimationManager，
+按脚本执行点击、拖动、喂食和闲置等操作，结果以 JSON 输出，
+便于在普通 Linux 机器上对比不同提交之间的性能变化。
+
+用法:
+    python benchmarks/bench_pet.py [--assets 资源目录] [--duration 秒] [--scenario 名称 ...]
+                                   [--pets N] [--scaling N ...] [--output 结果.json]
+
+--scaling 会为每个桌宠数量各启动一个子进程运行闲置场景，
+用来对比内存和定时器唤醒次数随桌宠数量的增长。
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+
+# 必须在导入 PyQt 之前设置
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, "src"))
+
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtGui import QMouseEvent
+from PyQt6.QtCore import Qt, QEvent, QPointF, QTimer, QEventLoop
+from instrumentation import get_instrumentation
+
+def peak_rss_kb():
+    """进程峰值常驻内存（KB）"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 上 ru_maxrss 单位是字节
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def summarize(samples):
+    """把耗时样本（秒）汇总为毫秒统计"""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+    return {
+        "count": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "max_ms": ordered[-1] * 1000
+    }
+
+class Probe:
+    """包装宠物的热路径方法，统计调用次数和耗时"""
+    def __init__(self, pets):
+        self.update_samples = []
+        # 图片解码次数来自统计对象的计数器（包括皮肤加载线程中的解码），负缓存命中等不算
+        self.instrumentation = get_instrumentation()
+        self.decodes_before = 0
+        for pet in pets:
+            self.attach(pet)
+    
+    def attach(self, pet):
+        update_image = pet.update_image
+        
+        def timed_update_image():
+            start = time.perf_counter()
+            update_image()
+            self.update_samples.append(time.perf_counter() - start)
+        
+        pet.update_image = timed_update_image
+    
+    @property
+    def decodes(self):
+        return self.instrumentation.counters.get("decode", 0) - self.decodes_before
+    
+    def reset(self):
+        self.update_samples = []
+        self.decodes_before = self.instrumentation.counters.get("decode", 0)
+
+def run_for(app, seconds):
+    """运行事件循环指定的时间"""
+    loop = QEventLoop()
+    QTimer.singleShot(int(seconds * 1000), loop.quit)
+    loop.exec()
+
+def mouse_event(event_type, local_pos, global_pos, button=Qt.MouseButton.LeftButton):
+    buttons = Qt.MouseButton.NoButton if event_type == QEvent.Type.MouseButtonRelease else button
+    return QMouseEvent(event_type, QPointF(local_pos), QPointF(global_pos), button, buttons,
+                       Qt.KeyboardModifier.NoModifier)
+
+def sprite_point(pet, fx, fy):
+    """精灵上的一点（按精灵宽高的比例），窗口的其余部分是留给气泡的透明区域"""
+    rect = pet.sprite_rect
+    return QPointF(rect.x() + rect.width() * fx, rect.y() + rect.height() * fy)
+
+def scenario_idle(app, pet, duration):
+    run_for(app, duration)
+
+def scenario_click(app, pet, duration):
+    end = time.monotonic() + duration
+    center = sprite_point(pet, 0.5, 0.7)
+    while time.monotonic() < end:
+        global_pos = QPointF(pet.mapToGlobal(center.toPoint()))
+        pet.mousePressEvent(mouse_event(QEvent.Type.MouseButtonPress, center, global_pos))
+        run_for(app, 0.05)
+        pet.mouseReleaseEvent(mouse_event(QEvent.Type.MouseButtonRelease, center, global_pos))
+        run_for(app, 0.35)
+
+def scenario_drag(app, pet, duration):
+    end = time.monotonic() + duration
+    center = sprite_point(pet, 0.5, 0.5)
+    while time.monotonic() < end:
+        start = QPointF(pet.mapToGlobal(center.toPoint()))
+        pet.mousePressEvent(mouse_event(QEvent.Type.MouseButtonPress, center, start))
+        # 模拟高回报率鼠标：每毫秒一个移动事件
+        for step in range(200):
+            pos = start + QPointF(step % 50, step // 4)
+            pet.mouseMoveEvent(mouse_event(QEvent.Type.MouseMove, center, pos))
+            if step % 10 == 0:
+                app.processEvents()
+            time.sleep(0.001)
+        pet.mouseReleaseEvent(mouse_event(QEvent.Type.MouseButtonRelease, center, start))
+        run_for(app, 0.3)
+
+def scenario_feed(app, pet, duration):
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        pet.feed_pet()
+        run_for(app, 0.5)
+
+def scenario_mixed(app, pet, duration):
+    part = duration / 4
+    scenario_click(app, pet, part)
+    scenario_drag(app, pet, part)
+    scenario_feed(app, pet, part)
+    scenario_idle(app, pet, part)
+
+SCENARIOS = {
+    "idle": scenario_idle,
+    "click": scenario_click,
+    "drag": scenario_drag,
+    "feed": scenario_feed,
+    "mixed": scenario_mixed
+}
+
+def run_scenario(app, pets, probe, name, duration):
+    # 只操作第一只桌宠，其余桌宠保持闲置
+    pet = pets[0]
+    scheduler = pet.animation_manager.scheduler
+    probe.reset()
+    wakeups_before = scheduler.wakeups
+    start = time.monotonic()
+    
+    SCENARIOS[name](app, pet, duration)
+    
+    elapsed = time.monotonic() - start
+    return {
+        "elapsed_s": elapsed,
+        "update_image": summarize(probe.update_samples),
+        "decodes": probe.decodes,
+        "decodes_per_s": probe.decodes / elapsed,
+        "timer_wakeups_per_min": (scheduler.wakeups - wakeups_before) / elapsed * 60,
+        "pending_tasks": scheduler.pending_count(),
+        "asset_store": pet.image_manager.asset_store.stats(),
+        "peak_rss_kb": peak_rss_kb()
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="桌宠动画热路径基准测试")
+    parser.add_argument("--assets", default=os.path.join(REPO_DIR, "assets"), help="图片资源目录")
+    parser.add_argument("--duration", type=float, default=5.0, help="每个场景运行的秒数")
+    parser.add_argument("--scenario", nargs="*", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--pets", type=int, default=1, help="同一进程中的桌宠数量")
+    parser.add_argument("--scaling", nargs="*", type=int, help="依次测量这些桌宠数量下的资源占用")
+    parser.add_argument("--output", help="结果 JSON 文件，默认输出到标准输出")
+    args = parser.parse_args()
+    
+    if args.scaling:
+        results = run_scaling(args)
+    else:
+        results = run_benchmark(args)
+    
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+def run_scaling(args):
+    """每个桌宠数量各跑一个子进程，汇总内存与唤醒次数"""
+    baseline = None
+    points = []
+    for count in args.scaling:
+        command = [sys.executable, os.path.abspath(__file__), "--assets", args.assets,
+                   "--duration", str(args.duration), "--scenario", "idle", "--pets", str(count)]
+        output = subprocess.check_output(command, stderr=subprocess.DEVNULL, text=True)
+        result = json.loads(output[output.index("{"):])
+        idle = result["scenarios"]["idle"]
+        point = {
+            "pets": count,
+            "peak_rss_kb": result["peak_rss_kb"],
+            "timer_wakeups_per_min": idle["timer_wakeups_per_min"],
+            "time_to_first_frame_ms": result["time_to_first_frame_ms"]
+        }
+        if baseline is None:
+            baseline = point
+        else:
+            # 相对单只桌宠线性增长的比例，小于 1 说明是次线性增长
+            base_pets = baseline["pets"]
+            point["rss_vs_linear"] = point["peak_rss_kb"] / (baseline["peak_rss_kb"] * count / base_pets)
+            if baseline["timer_wakeups_per_min"]:
+                point["wakeups_vs_linear"] = point["timer_wakeups_per_min"] / (
+                    baseline["timer_wakeups_per_min"] * count / base_pets)
+        points.append(point)
+    return {"commit": git_commit(), "platform": platform.platform(), "scaling": points}
+
+def run_benchmark(args):
+    os.environ["VPET_ASSET_DIR"] = os.path.abspath(args.assets)
+    # 每次测试都从空存档开始，也不改动用户自己的存档
+    os.environ["VPET_STATE_FILE"] = os.path.join(tempfile.mkdtemp(prefix="vpet-bench-"), "state.json")
+    
+    start = time.perf_counter()
+    app = QApplication(sys.argv)
+    from main import create_pets
+    pets = create_pets(args.pets, start)
+    
+    # 等待首次绘制完成（桌宠在首帧后才启动后台任务）
+    deadline = time.monotonic() + 2.0
+    while not pets[0].startup_finished and time.monotonic() < deadline:
+        app.processEvents(QEventLoop.ProcessEventsFlag.AllEvents, 10)
+    time_to_first_frame = (pets[0].time_to_first_frame_ms or 0.0) / 1000
+    
+    probe = Probe(pets)
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "qpa": app.platformName(),
+        "pets": len(pets),
+        "time_to_first_frame_ms": time_to_first_frame * 1000,
+        "scenarios": {}
+    }
+    for name in args.scenario:
+        results["scenarios"][name] = run_scenario(app, pets, probe, name, args.duration)
+    results["peak_rss_kb"] = peak_rss_kb()
+    return results
+
+if __name__ == "__main__":
+    main()
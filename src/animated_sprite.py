@@ -0,0 +1,117 @@
+from collections import OrderedDict
+from PyQt6.QtCore import QBuffer, QByteArray, QIODevice
+from PyQt6.QtGui import QImageReader
+from instrumentation import get_instrumentation
+
+# 可以作为一个状态全部帧来源的多帧动画格式（APNG 需要 Qt 的图片插件支持）
+ANIMATED_EXTENSIONS = (".gif", ".webp", ".apng")
+
+# 文件中没有给出帧时长时使用的默认值（毫秒）
+DEFAULT_FRAME_DELAY = 100
+
+class AnimatedSprite:
+    """多帧动画图片（GIF/WebP/APNG），通过 QImageReader 按顺序增量解码
+
+    打开时顺序读一遍文件，只记下帧数和每帧的显示时长，解码出的图像立即丢弃。
+    播放时按顺序继续读下一帧，最近 ring_size 帧保留在环形缓冲区中；
+    需要往回取帧（例如循环回到开头）时重新打开文件，所以再长的动画也不会
+    全部解码后驻留在内存里。
+    """
+    def __init__(self, source, ring_size=8):
+        # 文件路径，或（zip 皮肤包中读出的）图片数据
+        self.source = source
+        self.ring_size = ring_size
+        self.delays = []
+        
+        # 帧号 -> 解码出的原始 QImage；(帧号, 标记) -> 转换结果（例如缩放后的 QPixmap）
+        self.ring = OrderedDict()
+        self.converted = OrderedDict()
+        
+        self.reader = None
+        self.buffer = None
+        self.next_index = 0
+        self.instrumentation = get_instrumentation()
+        self.scan()
+    
+    @property
+    def frame_count(self):
+        return len(self.delays)
+    
+    def open(self):
+        """从头开始读取"""
+        if isinstance(self.source, bytes):
+            self.buffer = QBuffer()
+            self.buffer.setData(QByteArray(self.source))
+            self.buffer.open(QIODevice.OpenModeFlag.ReadOnly)
+            self.reader = QImageReader(self.buffer)
+        else:
+            self.reader = QImageReader(self.source)
+        self.next_index = 0
+    
+    def close(self):
+        """关闭读取器"""
+        self.reader = None
+        self.buffer = None
+    
+    def scan(self):
+        """顺序读一遍，记录每帧的显示时长"""
+        self.open()
+        while True:
+            image = self.reader.read()
+            if image.isNull():
+                break
+            self.instrumentation.count("decode")
+            delay = self.reader.nextImageDelay()
+            self.delays.append(delay if delay > 0 else DEFAULT_FRAME_DELAY)
+        self.close()
+    
+    def frame_delay(self, index):
+        """第 index 帧的显示时长（毫秒）"""
+        return self.delays[index % len(self.delays)]
+    
+    def read_frame(self, index):
+        """解码第 index 帧，需要往回跳时重新打开文件"""
+        if self.reader is None or index < self.next_index:
+            self.open()
+        image = None
+        while self.next_index <= index:
+            image = self.reader.read()
+            self.next_index += 1
+            if image.isNull():
+                self.close()
+                return None
+            self.instrumentation.count("decode")
+        return image
+    
+    def image(self, index):
+        """第 index 帧的原始图像，最近解码的帧从环形缓冲区读取"""
+        index %= len(self.delays)
+        image = self.ring.get(index)
+        if image is not None:
+            self.ring.move_to_end(index)
+            return image
+        
+        image = self.read_frame(index)
+        if image is None:
+            return None
+        self.ring[index] = image
+        if len(self.ring) > self.ring_size:
+            self.ring.popitem(last=False)
+        return image
+    
+    def frame(self, index, tag, convert):
+        """第 index 帧经过 convert 处理后的结果（例如缩放），按 tag 区分并同样只保留最近几帧"""
+        key = (index % len(self.delays), tag)
+        value = self.converted.get(key)
+        if value is not None:
+            self.converted.move_to_end(key)
+            return value
+        
+        image = self.image(index)
+        if image is None:
+            return None
+        value = convert(image)
+        self.converted[key] = value
+        if len(self.converted) > self.ring_size:
+            self.converted.popitem(last=False)
+        return value
@@ -1,238 +1,352 @@
-from PyQt6.QtCore import QTimer, QTime, Qt
+import time
 import random
+from collections import deque
+from scheduler import Scheduler
+from mood_engine import MoodEngine
+from rate_tracker import RateTracker
+from instrumentation import get_instrumentation
 
 class AnimationManager:
-    def __init__(self, parent, image_manager):
+    # 两次随机特殊动画之间的间隔范围（秒）
+    SPECIAL_ANIMATION_INTERVAL = (10, 150)
+    
+    # 6秒内开始拖动超过5次视为暴力拖动，5秒内点击8次以上会被戳生气
+    ANGRY_DRAG_WINDOW = 6.0
+    ANGRY_DRAG_COUNT = 5
+    ANGRY_CLICK_WINDOW = 5.0
+    ANGRY_CLICK_COUNT = 8
+    
+    # 生气后 20 秒消气，折腾得越激烈消气越慢（最多3倍）
+    ANGRY_CALM_DOWN = 20.0
+    MAX_ANGRY_SCALE = 3.0
+    
+    # 30秒内摸头越多，愉快的心情保持得越久（最多3倍）
+    HEADPAT_WINDOW = 30.0
+    MAX_HAPPY_BOOST = 3.0
+    
+    # 正在吃的和排队等着吃的食物最多这么多份，再多的拒收
+    MAX_EATING_QUEUE = 8
+    
+    def __init__(self, parent, image_manager, scheduler=None, mood_thresholds=None):
         self.parent = parent
         self.image_manager = image_manager
         
-        # 动画状态
-        self.state = "idle"
-        self.current_frame = 0
+        # 调度器可由多只桌宠共用，未指定时单独创建
+        self.scheduler = scheduler
+        
+        # 动画状态机：帧时长、循环和状态转换都来自定义文件
+        self.state_machine = image_manager.state_machine
+        self.guards = {"headpat_enabled": lambda: getattr(self.parent, "enable_headpat", True)}
         
-        # 闲置状态计数
-        self.idle_counter = 0
-        self.idle_durations = [20, 5, 20, 1]
+        # 动画状态（state 为状态名，state_id 为编译后的状态编号）
+        self.state_id = self.state_machine.initial_state
+        self.state = self.state_machine.state_names[self.state_id]
+        self.current_frame = 0
         
-        # 随机特殊动画计时
-        self.last_special_animation = QTime.currentTime()
-        self.idle_time_counter = 0
-        self.drag_count = 0
-        self.last_drag_time = QTime.currentTime()
+        # 拖动、点击和摸头的频率（单调时钟上的滑动窗口）
+        self.drag_rate = RateTracker(self.ANGRY_DRAG_WINDOW)
+        self.click_rate = RateTracker(self.ANGRY_CLICK_WINDOW)
+        self.headpat_rate = RateTracker(self.HEADPAT_WINDOW)
         
         # 状态记录
-        self.mood = "normal"  # normal, happy, bored, angry
-        self.last_interaction_time = QTime.currentTime()
+        self.mood = "normal"  # normal, happy, bored, angry, sleeping
+        
+        # 进食队列：一次拖来的多份食物依次吃完；meal 是这一顿已经吃下的食物，心情按整顿饭计算
+        self.eating_queue = deque()
+        self.meal = []
+        
+        # 随机动画与睡眠检查开关
+        self.special_animation_enabled = True
+        self.sleep_check_enabled = True
         
         # 初始化计时器
         self.setup_timers()
+        
+        # 心情和睡眠：按距上次互动的时间只预约下一个阈值，闲置时不轮询
+        self.mood_engine = MoodEngine(self.scheduler, self.task_key("mood"), self.on_mood_threshold, mood_thresholds)
+        self.happy_decay = self.mood_engine.thresholds["happy_decay"]
     
     def setup_timers(self):
-        """设置动画计时器"""
-        # 站立动画计时器
-        self.idle_timer = QTimer(self.parent)
-        self.idle_timer.timeout.connect(self.animate_idle)
-        self.idle_timer.start(100)
-        
-        # 走路动画计时器
-        self.walk_timer = QTimer(self.parent)
-        self.walk_timer.timeout.connect(self.animate_walk)
-        self.walk_timer.setInterval(200)
-        
-        # 点击恢复计时器
-        self.click_timer = QTimer(self.parent)
-        self.click_timer.setSingleShot(True)
-        self.click_timer.timeout.connect(self.restore_idle)
-        
-        # 气泡计时器
-        self.bubble_timer = QTimer(self.parent)
-        self.bubble_timer.timeout.connect(self.check_mood_change)
-        self.bubble_timer.start(10000)  # 每10秒检查一次心情变化
-        
-        # 随机特殊动画计时器
-        self.special_animation_timer = QTimer(self.parent)
-        self.special_animation_timer.timeout.connect(self.trigger_special_animation)
-        self.special_animation_timer.start(5000)  # 每5秒检查一次是否触发特殊动画
-        
-        # 睡眠检查计时器
-        self.sleep_check_timer = QTimer(self.parent)
-        self.sleep_check_timer.timeout.connect(self.check_sleep_state)
-        self.sleep_check_timer.start(30000)  # 每30秒检查一次是否该睡觉
-    
-    def animate_idle(self):
-        """闲置动画帧更新"""
-        if self.state == "idle":
-            self.idle_counter += 1
-            self.idle_time_counter += 1
-            
-            # 检查当前帧是否应该切换
-            if self.idle_counter >= self.idle_durations[self.current_frame]:
-                self.idle_counter = 0
-                self.current_frame = (self.current_frame + 1) % len(self.image_manager.idle_images)
-                self.parent.update_image()
-    
-    def animate_walk(self):
-        """走路动画帧更新"""
-        if self.state == "walk":
-            self.current_frame = (self.current_frame + 1) % len(self.image_manager.walk_images)
-            self.parent.update_image()
+        """设置动画计时器，所有定时任务共用一个调度器"""
+        if self.scheduler is None:
+            self.scheduler = Scheduler(self.parent)
+        self.scheduler.observer = get_instrumentation()
+        
+        # 帧切换：单次任务，只在下一帧到期时唤醒
+        self.schedule_next_frame()
+    
+    def start_background_tasks(self):
+        """启动心情、随机动画和睡眠检查，首帧显示之后再调用"""
+        # 心情变化和睡眠都由心情引擎在阈值到期时触发
+        self.mood_engine.set_enabled("sleep", self.sleep_check_enabled)
+        self.mood_engine.start()
+        
+        # 随机预约下一次特殊动画
+        self.set_special_animation_enabled(self.special_animation_enabled)
+    
+    def task_key(self, name):
+        """本桌宠在（可能共用的）调度器中的任务 key"""
+        return (id(self), name)
     
-    def set_click_state(self):
-        """设置为点击状态"""
-        self.state = "click"
+    def set_special_animation_enabled(self, enabled):
+        """开启或关闭随机特殊动画"""
+        self.special_animation_enabled = enabled
+        if enabled:
+            if not self.scheduler.is_scheduled(self.task_key("special_animation")):
+                self.schedule_special_animation()
+        else:
+            self.scheduler.cancel(self.task_key("special_animation"))
+    
+    def schedule_special_animation(self):
+        """在随机的时间后预约一次特殊动画"""
+        delay = random.uniform(*self.SPECIAL_ANIMATION_INTERVAL)
+        self.scheduler.call_later(int(delay * 1000), self.trigger_special_animation, key=self.task_key("special_animation"))
+    
+    def set_sleep_check_enabled(self, enabled):
+        """开启或关闭长时间不活动后的睡眠"""
+        self.sleep_check_enabled = enabled
+        self.mood_engine.set_enabled("sleep", enabled)
+    
+    def record_interaction(self):
+        """记录一次互动：无聊和睡意消失，心情阈值重新计时"""
+        if self.mood in ("bored", "sleeping"):
+            self.mood = "normal"
+        self.mood_engine.touch()
+        self.parent.schedule_save()
+    
+    def interaction_rates(self):
+        """最近拖动、点击和摸头的频率（次/分钟），按窗口内事件实际跨越的时间计算，供心情逻辑使用"""
+        return {
+            "drag": self.drag_rate.burst_rate() * 60,
+            "click": self.click_rate.burst_rate() * 60,
+            "headpat": self.headpat_rate.burst_rate() * 60
+        }
+    
+    def rough_handling(self):
+        """拖动和点击的激烈程度：最近的频率相对于生气阈值频率的倍数之和"""
+        rates = self.interaction_rates()
+        drag = rates["drag"] / (self.ANGRY_DRAG_COUNT / self.ANGRY_DRAG_WINDOW * 60)
+        click = rates["click"] / (self.ANGRY_CLICK_COUNT / self.ANGRY_CLICK_WINDOW * 60)
+        return drag + click
+    
+    def update_happy_decay(self, extra_boost=1.0):
+        """按最近的摸头次数（和食物的效果）调整愉快心情的持续时间"""
+        headpats = self.headpat_rate.count()
+        boost = max(1.0, 1.0 + 0.5 * (headpats - 1)) * extra_boost
+        self.mood_engine.set_threshold("happy_decay", self.happy_decay * min(self.MAX_HAPPY_BOOST, boost))
+    
+    def last_interaction_timestamp(self):
+        """上次互动的时间（Unix 时间戳），用于保存"""
+        return time.time() - self.mood_engine.idle_seconds()
+    
+    def restore_mood(self, mood, last_interaction):
+        """恢复保存的心情和上次互动时间
+
+        关闭期间越过的阈值按到期先后补上效果（不显示气泡），之后只预约还没到期的阈值。
+        """
+        if mood in ("normal", "happy", "bored", "angry", "sleeping"):
+            self.mood = mood
+        if self.mood == "sleeping":
+            self.dispatch("sleep")
+        elif self.mood == "angry":
+            self.schedule_calm_down()
+        if last_interaction is not None:
+            # 睡眠开关在启动后台任务时才交给心情引擎，这里先同步，关闭睡眠时不补睡
+            self.mood_engine.set_enabled("sleep", self.sleep_check_enabled)
+            for name in self.mood_engine.restore(max(0.0, time.time() - last_interaction)):
+                self.on_mood_threshold(name, quiet=True)
+    
+    def dispatch(self, event):
+        """向状态机发送事件，发生状态转换时返回 True"""
+        target = self.state_machine.next_state(self.state_id, event, self.guards)
+        if target is None:
+            return False
+        self.enter_state(target)
+        return True
+    
+    def enter_state(self, state_id):
+        """切换到指定状态并从第一帧开始播放"""
+        self.state_id = state_id
+        self.state = self.state_machine.state_names[state_id]
         self.current_frame = 0
         self.parent.update_image()
-        self.click_timer.start(300)
+        self.schedule_next_frame()
+    
+    def schedule_next_frame(self):
+        """按当前帧的显示时长预约下一次帧切换"""
+        duration = self.image_manager.frame_duration(self.state_id, self.current_frame)
+        # 同 key 的旧任务会被替换，过期的帧切换不会再触发
+        self.scheduler.call_later(duration, self.advance_frame, key=self.task_key("frame"))
+    
+    def advance_frame(self):
+        """帧到期：切换到下一帧，一次性动画播放完毕后恢复闲置"""
+        next_frame = self.current_frame + 1
+        if next_frame >= self.image_manager.frame_count(self.state_id):
+            if not self.state_machine.looping[self.state_id]:
+                self.restore_idle()
+                return
+            next_frame = 0
+        
+        self.current_frame = next_frame
+        self.parent.update_image()
+        self.schedule_next_frame()
+    
+    def set_click_state(self, on_head=False):
+        """设置为点击状态，点在头部时触发摸头"""
+        self.dispatch("click")
         
         # 更新最后交互时间
-        self.last_interaction_time = QTime.currentTime()
+        self.record_interaction()
         
-        # 检查点击位置是否在头部，若是则触发"摸头"动画
-        cursor_pos = self.parent.mapFromGlobal(self.parent.cursor().pos())
-        pet_height = self.parent.height()
-        if cursor_pos.y() < pet_height * 0.4:  # 假设头部在上方40%的区域
+        # 短时间内连续点击太多次会生气
+        self.click_rate.add()
+        if self.click_rate.count() > self.ANGRY_CLICK_COUNT:
+            intensity = self.rough_handling()
+            self.click_rate.clear()
+            self.set_angry_state(intensity)
+            return
+        
+        # 点击位置在头部时触发"摸头"动画（由点击区域判断）
+        if on_head:
             self.set_headpat_state()
     
     def set_headpat_state(self):
         """设置为摸头状态"""
-        self.state = "headpat"
-        self.current_frame = 0
-        self.parent.update_image()
-        self.click_timer.start(800)  # 摸头动画持续时间稍长
+        if not self.dispatch("headpat"):
+            return
         
-        # 触发心情变好
+        # 触发心情变好，最近摸头越多愉快持续越久
+        self.record_interaction()
+        self.headpat_rate.add()
+        self.update_happy_decay()
         self.mood = "happy"
         self.parent.show_emotion_bubble("happy")
     
     def set_walk_state(self):
         """设置为走路状态"""
-        if self.state != "walk":
-            self.state = "walk"
-            self.current_frame = 0
-            self.parent.update_image()
-            # 启动走路动画计时器
-            if not self.walk_timer.isActive():
-                self.walk_timer.start()
-            
-            # 记录拖动次数和时间，用于检测暴力拖动
-            current_time = QTime.currentTime()
-            if self.last_drag_time.secsTo(current_time) < 2:  # 2秒内的拖动视为连续
-                self.drag_count += 1
-                if self.drag_count > 5:  # 5次以上连续快速拖动
-                    self.set_angry_state()
-                    self.drag_count = 0
-            else:
-                self.drag_count = 1
+        if self.dispatch("drag"):
+            self.record_interaction()
             
-            self.last_drag_time = current_time
-            self.last_interaction_time = current_time
+            # 记录拖动开始的时间，短时间内拖动次数太多视为暴力拖动
+            self.drag_rate.add()
+            if self.drag_rate.count() > self.ANGRY_DRAG_COUNT:
+                intensity = self.rough_handling()
+                self.drag_rate.clear()
+                self.set_angry_state(intensity)
     
-    def set_angry_state(self):
-        """设置为生气状态"""
-        self.state = "angry"
-        self.current_frame = 0
-        self.parent.update_image()
+    def set_angry_state(self, intensity=1.0):
+        """设置为生气状态，intensity 是被折腾的激烈程度（见 rough_handling）"""
+        self.dispatch("angry")
         self.mood = "angry"
         self.parent.show_emotion_bubble("angry")
-        # 生气状态持续时间
-        QTimer.singleShot(3000, self.restore_idle)
+        self.schedule_calm_down(intensity)
+    
+    def schedule_calm_down(self, intensity=1.0):
+        """预约消气，越激烈消气越慢"""
+        delay = self.ANGRY_CALM_DOWN * min(self.MAX_ANGRY_SCALE, max(1.0, intensity))
+        self.scheduler.call_later(int(delay * 1000), self.calm_down, key=self.task_key("calm_down"))
+    
+    def calm_down(self):
+        """消气：还在生气时恢复正常心情（摸头或喂食已经让心情变好时不变）"""
+        if self.mood == "angry":
+            self.mood = "normal"
+            self.parent.schedule_save()
     
     def set_sleep_state(self):
         """设置为睡觉状态"""
-        if self.state != "sleep":
-            self.state = "sleep"
-            self.current_frame = 0
-            self.parent.update_image()
-            self.idle_time_counter = 0
+        if self.dispatch("sleep"):
             self.mood = "sleeping"
     
     def set_blink_state(self):
         """设置为眨眼状态"""
-        self.state = "blink"
-        self.current_frame = 0
-        self.parent.update_image()
-        # 眨眼持续时间短
-        QTimer.singleShot(500, self.restore_idle)
+        self.dispatch("blink")
     
     def set_stretch_state(self):
         """设置为伸懒腰状态"""
-        self.state = "stretch"
-        self.current_frame = 0
-        self.parent.update_image()
-        # 伸懒腰持续时间
-        QTimer.singleShot(1200, self.restore_idle)
+        self.dispatch("stretch")
     
-    def set_eating_state(self):
-        """设置为吃东西状态"""
-        self.state = "eating"
-        self.current_frame = 0
-        self.parent.update_image()
-        # 吃东西的动画持续时间
-        QTimer.singleShot(1500, self.restore_idle)
+    def set_eating_state(self, food=None):
+        """设置为吃东西状态，动画、心情和气泡由食物定义决定"""
+        event = food.animation if food is not None else "eat"
+        if not self.dispatch(event) and event != "eat":
+            self.dispatch("eat")
         
-        # 吃东西会让心情变好
-        self.mood = "happy"
-        self.parent.show_emotion_bubble("happy")
+        # 吃东西会改变心情：这一顿里让心情变好的食物越多，愉快的时间越长
+        self.record_interaction()
+        first = not self.meal
+        self.meal.append(food)
+        boost = sum(f.happy_boost if f is not None else 1.0
+                    for f in self.meal if f is None or f.mood == "happy")
+        if boost:
+            self.update_happy_decay(boost)
+            self.mood = "happy"
+        else:
+            self.mood = food.mood
+        
+        # 一顿饭只在开始时显示一次气泡
+        if first:
+            self.parent.show_emotion_bubble(food.bubble if food is not None else "happy")
+    
+    def queue_food(self, foods):
+        """把食物加入进食队列，返回接受的份数，队列满时多出的食物被拒收"""
+        accepted = list(foods)[:max(0, self.MAX_EATING_QUEUE - self.pending_food_count())]
+        self.eating_queue.extend(accepted)
+        # 正在吃的一顿饭（不论食物用的是哪个动画）吃完当前这份后会接着吃队列，不打断
+        if accepted and not self.meal:
+            self.eat_next()
+        return len(accepted)
+    
+    def pending_food_count(self):
+        """还没吃完的食物份数：排队的加上正在吃的一份"""
+        return len(self.eating_queue) + (1 if self.meal else 0)
+    
+    def eating_queue_full(self):
+        return self.pending_food_count() >= self.MAX_EATING_QUEUE
+    
+    def eat_next(self):
+        """开始吃队列中的下一份食物"""
+        self.set_eating_state(self.eating_queue.popleft())
     
     def stop_walk_animation(self):
         """停止走路动画"""
-        if self.walk_timer.isActive():
-            self.walk_timer.stop()
+        if self.state == "walk":
+            self.scheduler.cancel(self.task_key("frame"))
     
     def restore_idle(self):
-        """恢复到闲置状态"""
-        previous_state = self.state
-        self.state = "idle"
-        self.current_frame = 0
-        self.idle_counter = 0
-        
-        # 如果从睡眠状态恢复，执行"醒来"的伸懒腰动画
-        if previous_state == "sleep":
-            self.set_stretch_state()
+        """恢复到闲置状态，进食队列中还有食物时接着吃"""
+        if self.eating_queue:
+            self.eat_next()
             return
-            
-        self.parent.update_image()
+        self.meal.clear()
+        
+        # 转换表中定义了从睡眠状态恢复时先执行"醒来"的伸懒腰动画
+        self.dispatch("restore")
     
     def trigger_special_animation(self):
-        """触发随机特殊动画 (眨眼/伸懒腰)"""
-        # 只在闲置状态下触发特殊动画
-        if self.state != "idle":
-            return
+        """触发随机特殊动画 (眨眼/伸懒腰)，并预约下一次"""
+        self.schedule_special_animation()
         
-        # 检查距离上次特殊动画的时间
-        current_time = QTime.currentTime()
-        if self.last_special_animation.secsTo(current_time) < 10:
-            return  # 10秒内不重复触发
-        
-        # 随机决定是否触发特殊动画 (10-30秒范围内的随机概率)
-        random_interval = random.randint(10, 30)
-        if random.random() < 1.0 / random_interval:
-            # 随机选择眨眼或伸懒腰
-            animation_type = random.choice(["blink", "stretch"])
-            if animation_type == "blink":
-                self.set_blink_state()
-            else:
-                self.set_stretch_state()
-            
-            self.last_special_animation = current_time
+        # 只在闲置状态下触发特殊动画（事件列表由定义文件给出）
+        if self.state == "idle" and self.state_machine.random_events:
+            self.dispatch(random.choice(self.state_machine.random_events))
     
-    def check_sleep_state(self):
-        """检查是否应该进入睡眠状态"""
-        current_time = QTime.currentTime()
+    def on_mood_threshold(self, name, quiet=False):
+        """心情引擎回调：距上次互动的时间越过了某个阈值，quiet 时不显示气泡"""
+        # 长时间（默认3分钟）没有互动，变得无聊
+        if name == "bored":
+            if self.mood not in ("bored", "sleeping"):
+                self.mood = "bored"
+                if not quiet:
+                    self.parent.show_emotion_bubble("bored")
         
-        # 如果超过10分钟没有互动，进入睡眠状态
-        if self.last_interaction_time.secsTo(current_time) > 600 and self.state != "sleep":
-            self.set_sleep_state()
-    
-    def check_mood_change(self):
-        """检查并更新心情状态"""
-        current_time = QTime.currentTime()
+        # 愉快的心情随着时间推移恢复正常
+        elif name == "happy_decay":
+            if self.mood == "happy":
+                self.mood = "normal"
         
-        # 如果长时间（3分钟以上）没有互动，变得无聊
-        if self.mood != "bored" and self.mood != "sleeping" and self.last_interaction_time.secsTo(current_time) > 180:
-            self.mood = "bored"
-            self.parent.show_emotion_bubble("bored")
+        # 长时间（默认10分钟）没有互动，进入睡眠状态
+        elif name == "sleep":
+            if self.state != "sleep":
+                self.set_sleep_state()
         
-        # 如果心情是愉快，随着时间推移恢复正常
-        if self.mood == "happy" and self.last_interaction_time.secsTo(current_time) > 60:
-            self.mood = "normal"
\ No newline at end of file
+        self.parent.schedule_save()
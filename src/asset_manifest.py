@@ -0,0 +1,114 @@
+import os
+import json
+import hashlib
+from logger import get_logger
+
+logger = get_logger("asset_manifest")
+
+MANIFEST_VERSION = 1
+
+def default_asset_dir():
+    """资源目录：环境变量 VPET_ASSET_DIR，其次是仓库中的 assets 目录，与当前工作目录无关"""
+    asset_dir = os.environ.get("VPET_ASSET_DIR")
+    if asset_dir:
+        return os.path.abspath(asset_dir)
+    repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    asset_dir = os.path.join(repo_dir, "assets")
+    if os.path.isdir(asset_dir):
+        return asset_dir
+    return os.getcwd()
+
+def default_cache_dir():
+    """清单缓存目录"""
+    return os.environ.get("VPET_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "vpet")
+
+class AssetManifest:
+    """资源清单：记录资源目录中每个文件的路径、大小、修改时间和内容哈希
+
+    清单缓存在磁盘上，启动时只扫描一次目录，大小和修改时间都没变的文件
+    沿用缓存中的哈希，不再重新读取。文件名查找不区分大小写
+    （资源中既有 idle1.PNG 也有 shock1.png）。
+    """
+    def __init__(self, asset_dir=None, cache_dir=None):
+        self.asset_dir = asset_dir or default_asset_dir()
+        cache_dir = cache_dir or default_cache_dir()
+        dir_hash = hashlib.sha1(self.asset_dir.encode("utf-8")).hexdigest()[:12]
+        self.cache_path = os.path.join(cache_dir, f"manifest-{dir_hash}.json")
+        
+        self.entries = {}
+        self.index = {}
+        self.scan()
+    
+    def load_cache(self):
+        """读取磁盘上的清单缓存，格式不对时当作没有缓存"""
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if cached.get("version") != MANIFEST_VERSION or cached.get("asset_dir") != self.asset_dir:
+            return {}
+        return cached.get("entries", {})
+    
+    def save_cache(self):
+        """原子地写入清单缓存"""
+        data = {"version": MANIFEST_VERSION, "asset_dir": self.asset_dir, "entries": self.entries}
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp_path = self.cache_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning("无法写入资源清单缓存: %s", e)
+    
+    def scan(self):
+        """扫描一次资源目录，只对新增或变化的文件重新计算哈希"""
+        cached = self.load_cache()
+        entries = {}
+        changed = False
+        try:
+            with os.scandir(self.asset_dir) as it:
+                for entry in it:
+                    if not entry.is_file() or entry.name.startswith("."):
+                        continue
+                    stat = entry.stat()
+                    old = cached.get(entry.name)
+                    if old and old["size"] == stat.st_size and old["mtime_ns"] == stat.st_mtime_ns:
+                        entries[entry.name] = old
+                        continue
+                    entries[entry.name] = {
+                        "size": stat.st_size,
+                        "mtime_ns": stat.st_mtime_ns,
+                        "hash": self.hash_file(entry.path)
+                    }
+                    changed = True
+        except OSError as e:
+            logger.error("无法扫描资源目录 %s: %s", self.asset_dir, e)
+        
+        if changed or set(entries) != set(cached):
+            self.entries = entries
+            self.save_cache()
+        self.entries = entries
+        self.index = {name.lower(): name for name in entries}
+    
+    def hash_file(self, path):
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(65536), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    def resolve(self, name):
+        """返回资源文件的完整路径，文件不存在时返回 None"""
+        actual = self.index.get(name.lower())
+        if actual is None:
+            return None
+        return os.path.join(self.asset_dir, actual)
+    
+    def exists(self, name):
+        return name.lower() in self.index
+    
+    def content_hash(self, name):
+        actual = self.index.get(name.lower())
+        return self.entries[actual]["hash"] if actual else None
@@ -0,0 +1,135 @@
+from collections import OrderedDict
+from sprite_atlas import SpriteAtlas
+from asset_manifest import AssetManifest
+from skin_registry import SkinRegistry
+
+class FrameCache:
+    """已解码并缩放好的帧缓存，按 (皮肤, 状态, 帧, 缩放) 索引，LRU 淘汰"""
+    def __init__(self, max_size=64):
+        self.max_size = max_size
+        self.frames = OrderedDict()
+        
+        # 命中统计
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key):
+        """查找缓存帧，命中时移到队尾"""
+        pixmap = self.frames.get(key)
+        if pixmap is None:
+            self.misses += 1
+            return None
+        self.frames.move_to_end(key)
+        self.hits += 1
+        return pixmap
+    
+    def put(self, key, pixmap):
+        """放入缓存，超出容量时淘汰最久未使用的帧"""
+        self.frames[key] = pixmap
+        self.frames.move_to_end(key)
+        while len(self.frames) > self.max_size:
+            self.frames.popitem(last=False)
+    
+    def clear(self):
+        """清空缓存"""
+        self.frames.clear()
+    
+    def stats(self):
+        """返回缓存统计信息"""
+        return {
+            "size": len(self.frames),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+class AssetStore:
+    """多只桌宠共用的资源库：帧缓存和图集按 (皮肤, 缩放) 引用计数
+
+    某个缩放比例不再被任何桌宠使用后，最近释放的几个缩放版本仍保留在缓存中，
+    来回调整大小时不必重新缩放；更早的版本立即清出缓存。
+    皮肤的所有缩放比例都不再使用时，原始帧和图集也一并释放。
+    """
+    def __init__(self, max_frames=64, manifest=None, max_idle_variants=2):
+        # 资源清单在启动时只扫描一次资源目录
+        self.manifest = manifest or AssetManifest()
+        self.frame_cache = FrameCache(max_frames)
+        
+        # 解码后未缩放的原始帧，缩放比例变化时从这里重新缩放而不必重新解码
+        self.source_cache = FrameCache(max_frames)
+        
+        # 每个原始帧的点击区域，按 (皮肤, 文件名) 保存，与缩放比例无关
+        self.hit_masks = {}
+        
+        # 已确认找不到的图片 (皮肤, 文件名)，不再重复查找和解码
+        self.missing = set()
+        
+        self.ref_counts = {}
+        self.atlases = {}
+        
+        # 皮肤注册表，第一次需要时才扫描
+        self.skins = None
+        
+        # 没有使用者但暂时保留的缩放版本
+        self.idle_variants = OrderedDict()
+        self.max_idle_variants = max_idle_variants
+    
+    def acquire(self, skin_name, scale_factor):
+        """登记一个使用者"""
+        key = (skin_name, scale_factor)
+        self.ref_counts[key] = self.ref_counts.get(key, 0) + 1
+        self.idle_variants.pop(key, None)
+        if self.skins is not None:
+            self.skins.use(skin_name)
+    
+    def release(self, skin_name, scale_factor):
+        """注销一个使用者，没有使用者时清理对应资源"""
+        key = (skin_name, scale_factor)
+        count = self.ref_counts.get(key, 0) - 1
+        if count > 0:
+            self.ref_counts[key] = count
+            return
+        self.ref_counts.pop(key, None)
+        
+        self.idle_variants[key] = True
+        while len(self.idle_variants) > self.max_idle_variants:
+            old_skin, old_scale = self.idle_variants.popitem(last=False)[0]
+            frames = self.frame_cache.frames
+            for frame_key in [k for k in frames if k[0] == old_skin and k[3] == old_scale]:
+                del frames[frame_key]
+        
+        if not any(skin == skin_name for skin, _ in self.ref_counts):
+            self.atlases.pop(skin_name, None)
+            sources = self.source_cache.frames
+            for source_key in [k for k in sources if k[0] == skin_name]:
+                del sources[source_key]
+            for mask_key in [k for k in self.hit_masks if k[0] == skin_name]:
+                del self.hit_masks[mask_key]
+            self.missing = {k for k in self.missing if k[0] != skin_name}
+            
+            # 卸载最久没用过的皮肤包
+            if self.skins is not None:
+                self.skins.trim({skin for skin, _ in self.ref_counts})
+    
+    def get_skin_registry(self, frame_names):
+        """返回皮肤注册表，第一次调用时按帧名扫描内置皮肤和皮肤包"""
+        if self.skins is None:
+            self.skins = SkinRegistry(self.manifest, frame_names)
+        return self.skins
+    
+    def get_atlas(self, skin_name):
+        """返回皮肤图集（没有图集时为 None），同一皮肤只读取一次"""
+        if skin_name not in self.atlases:
+            self.atlases[skin_name] = SpriteAtlas.find(self.manifest, skin_name)
+        return self.atlases[skin_name]
+    
+    def stats(self):
+        """返回资源库统计信息"""
+        stats = self.frame_cache.stats()
+        stats["users"] = {f"{skin}@{scale}": count for (skin, scale), count in self.ref_counts.items()}
+        stats["sources"] = len(self.source_cache.frames)
+        stats["hit_masks"] = len(self.hit_masks)
+        stats["missing"] = len(self.missing)
+        stats["idle_variants"] = [f"{skin}@{scale}" for skin, scale in self.idle_variants]
+        stats["atlases"] = sorted(skin for skin, atlas in self.atlases.items() if atlas is not None)
+        return stats
@@ -0,0 +1,233 @@
+import time
+import heapq
+import itertools
+from collections import OrderedDict
+from PyQt6.QtGui import QPixmap, QPainter, QPainterPath, QPolygonF, QFont, QFontMetrics, QColor, QPen
+from PyQt6.QtCore import Qt, QRect, QRectF, QPointF, QSize
+from asset_store import FrameCache
+
+# 气泡位置：对话气泡在精灵右上方，情绪气泡在头顶偏右，两处各自只显示一个气泡
+SPEECH = "speech"
+EMOTION = "emotion"
+
+# 情绪气泡的优先级，高优先级的气泡会顶替正在显示的低优先级气泡
+EMOTION_PRIORITY = {"angry": 3, "happy": 2, "food": 2, "bored": 1}
+
+# 直接指定图片的气泡（例如食物自己的气泡）与吃东西的气泡同级
+DEFAULT_EMOTION_PRIORITY = 2
+
+# 排队的气泡轮到显示时至少显示这么久（毫秒）
+MIN_VISIBLE_MS = 800
+
+# 文字气泡的样式
+TEXT_FLAGS = Qt.AlignmentFlag.AlignLeft | Qt.TextFlag.TextWordWrap
+TEXT_COLOR = QColor(40, 40, 40)
+BORDER_COLOR = QColor(60, 60, 60)
+FILL_COLOR = QColor(255, 255, 255, 235)
+
+class Bubble:
+    """一个待显示或正在显示的气泡"""
+    def __init__(self, slot, pixmap, priority, duration_ms):
+        self.slot = slot
+        self.pixmap = pixmap
+        self.priority = priority
+        self.duration = duration_ms
+        # 排队的气泡超过这个时间还没轮到显示就丢弃
+        self.expires = time.monotonic() + duration_ms / 1000.0
+
+class BubbleOverlay:
+    """对话气泡和情绪气泡的合成器
+
+    气泡图像（图片气泡和文字气泡）渲染后缓存起来，重复显示时不再加载和绘制；
+    文字的排版尺寸按字符串缓存。每个位置同一时间只显示一个气泡，
+    优先级不低于当前气泡的新气泡直接替换它，优先级更低的进入有界队列，
+    当前气泡消失后按优先级依次显示，排队超时的丢弃。
+    气泡的消失时间是调度器中按位置区分的可取消任务，替换气泡时一并替换，
+    所以连续喂食或摸头时旧的隐藏任务不会提前收起新气泡。
+    气泡由桌宠在合成精灵时通过 paint() 一起绘制。
+    """
+    def __init__(self, widget, image_manager, scheduler, key, max_queued=4, cache_size=32):
+        self.widget = widget
+        self.image_manager = image_manager
+        self.scheduler = scheduler
+        self.key = key
+        self.max_queued = max_queued
+        
+        self.active = {SPEECH: None, EMOTION: None}
+        self.queues = {SPEECH: [], EMOTION: []}
+        self.counter = itertools.count()
+        
+        # 渲染好的气泡图像，和 (文字, 字号, 最大宽度) -> 文字排版尺寸
+        self.cache = FrameCache(cache_size)
+        self.text_sizes = OrderedDict()
+        self.max_text_sizes = 256
+    
+    def task_key(self, slot):
+        """气泡消失任务的 key，同一位置只保留一个"""
+        return (self.key, slot)
+    
+    def scale(self):
+        return self.image_manager.scale_factor
+    
+    def image_bubble(self, image_path, max_size):
+        """图片气泡，缩放到 max_size 以内"""
+        key = ("image", image_path, (max_size.width(), max_size.height()), self.scale())
+        pixmap = self.cache.get(key)
+        if pixmap is None:
+            pixmap = self.image_manager.get_overlay_image(image_path, max_size)
+            if pixmap is not None:
+                self.cache.put(key, pixmap)
+        return pixmap
+    
+    def emotion_bubble(self, emotion):
+        """情绪气泡图像，没有对应图片时返回 None"""
+        image_path = self.image_manager.get_emotion_bubble(emotion)
+        if not image_path:
+            return None
+        side = int(40 * self.scale())
+        return self.image_bubble(image_path, QSize(side, side))
+    
+    def speech_space(self):
+        """对话气泡可用的最大尺寸：精灵右侧的留白加上精灵宽度的五分之一，高度到精灵中部"""
+        margin = self.widget.bubble_margin()
+        sprite = self.widget.sprite_rect
+        return QSize(margin.width() + sprite.width() // 5, margin.height() + sprite.height() // 2)
+    
+    def text_font(self):
+        font = QFont()
+        font.setPixelSize(max(8, round(12 * self.scale())))
+        return font
+    
+    def text_size(self, text, font, max_width):
+        """文字在 max_width 内换行后的尺寸，按字符串缓存"""
+        key = (text, font.pixelSize(), max_width)
+        size = self.text_sizes.get(key)
+        if size is not None:
+            self.text_sizes.move_to_end(key)
+            return size
+        size = QFontMetrics(font).boundingRect(QRect(0, 0, max_width, 1 << 16), TEXT_FLAGS, text).size()
+        self.text_sizes[key] = size
+        while len(self.text_sizes) > self.max_text_sizes:
+            self.text_sizes.popitem(last=False)
+        return size
+    
+    def text_bubble(self, text):
+        """把文字绘制成对话气泡：圆角框加上指向精灵的尾巴"""
+        scale = self.scale()
+        ratio = self.widget.devicePixelRatioF()
+        space = self.speech_space()
+        key = ("text", text, (space.width(), space.height()), scale, ratio)
+        pixmap = self.cache.get(key)
+        if pixmap is not None:
+            return pixmap
+        
+        padding = max(3, round(6 * scale))
+        tail = max(4, round(8 * scale))
+        border = max(1.0, scale)
+        font = self.text_font()
+        size = self.text_size(text, font, max(1, space.width() - 2 * padding))
+        width = min(space.width(), size.width() + 2 * padding)
+        height = min(space.height(), size.height() + 2 * padding + tail)
+        
+        pixmap = QPixmap(round(width * ratio), round(height * ratio))
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(Qt.GlobalColor.transparent)
+        
+        body = QRectF(border / 2, border / 2, width - border, height - tail - border)
+        path = QPainterPath()
+        path.addRoundedRect(body, 6 * scale, 6 * scale)
+        tail_path = QPainterPath()
+        tail_path.addPolygon(QPolygonF([QPointF(padding, body.bottom() - border),
+                                        QPointF(padding + tail, body.bottom() - border),
+                                        QPointF(border / 2, height - border / 2)]))
+        path = path.united(tail_path)
+        
+        painter = QPainter(pixmap)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.setPen(QPen(BORDER_COLOR, border))
+        painter.setBrush(FILL_COLOR)
+        painter.drawPath(path)
+        painter.setPen(TEXT_COLOR)
+        painter.setFont(font)
+        painter.drawText(QRect(padding, padding, width - 2 * padding, height - tail - 2 * padding), TEXT_FLAGS, text)
+        painter.end()
+        
+        self.cache.put(key, pixmap)
+        return pixmap
+    
+    def rect(self, slot, pixmap=None):
+        """气泡在窗口中的位置，没有气泡时为空矩形"""
+        if pixmap is None:
+            bubble = self.active[slot]
+            if bubble is None:
+                return QRect()
+            pixmap = bubble.pixmap
+        size = pixmap.deviceIndependentSize().toSize()
+        sprite = self.widget.sprite_rect
+        if slot == SPEECH:
+            bottom = sprite.top() + sprite.height() // 2
+            return QRect(sprite.right() - sprite.width() // 5, bottom - size.height(), size.width(), size.height())
+        return QRect(sprite.right() - size.width() // 2, sprite.top() - size.height(), size.width(), size.height())
+    
+    def is_visible(self, slot):
+        return self.active[slot] is not None
+    
+    def show(self, slot, pixmap, priority=0, duration_ms=3000):
+        """显示气泡，当前气泡优先级更高时排队"""
+        bubble = Bubble(slot, pixmap, priority, duration_ms)
+        current = self.active[slot]
+        if current is not None and priority < current.priority:
+            self.enqueue(bubble)
+            return
+        self.activate(bubble, duration_ms)
+    
+    def activate(self, bubble, duration_ms):
+        """把气泡设为当前气泡，并替换掉原来的消失任务"""
+        slot = bubble.slot
+        self.widget.invalidate(self.rect(slot))
+        self.active[slot] = bubble
+        self.widget.invalidate(self.rect(slot))
+        self.scheduler.call_later(duration_ms, lambda: self.expire(slot), key=self.task_key(slot))
+    
+    def enqueue(self, bubble):
+        """排队等待显示，队列满时丢弃优先级最低（同优先级中最新）的气泡"""
+        queue = self.queues[bubble.slot]
+        heapq.heappush(queue, (-bubble.priority, next(self.counter), bubble))
+        if len(queue) > self.max_queued:
+            queue.remove(max(queue))
+            heapq.heapify(queue)
+    
+    def expire(self, slot):
+        """当前气泡到时间了，换成队列中还没过期的下一个气泡"""
+        rect = self.rect(slot)
+        self.active[slot] = None
+        self.widget.invalidate(rect)
+        
+        now = time.monotonic()
+        queue = self.queues[slot]
+        while queue:
+            _, _, bubble = heapq.heappop(queue)
+            remaining = (bubble.expires - now) * 1000
+            if remaining > 0:
+                self.activate(bubble, max(MIN_VISIBLE_MS, int(remaining)))
+                return
+    
+    def hide(self, slot):
+        """立即隐藏气泡并清空该位置的队列"""
+        self.scheduler.cancel(self.task_key(slot))
+        self.queues[slot].clear()
+        rect = self.rect(slot)
+        self.active[slot] = None
+        self.widget.invalidate(rect)
+    
+    def clear(self):
+        """隐藏所有气泡"""
+        for slot in self.active:
+            self.hide(slot)
+    
+    def paint(self, painter):
+        """在精灵之上绘制当前的气泡"""
+        for slot in (SPEECH, EMOTION):
+            bubble = self.active[slot]
+            if bubble is not None:
+                painter.drawPixmap(self.rect(slot).topLeft(), bubble.pixmap)
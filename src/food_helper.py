@@ -1,10 +1,18 @@
 from PyQt6.QtWidgets import QMainWindow, QLabel, QPushButton, QVBoxLayout, QWidget, QHBoxLayout
-from PyQt6.QtGui import QPixmap, QDrag
+from PyQt6.QtGui import QPixmap, QDrag, QPainter
 from PyQt6.QtCore import Qt, QMimeData, QPoint
+from food_registry import FoodRegistry, FOOD_MIME_TYPE
+from logger import get_logger
+
+logger = get_logger("food_helper")
 
 class FoodDragHelper(QMainWindow):
-    def __init__(self):
+    def __init__(self, food_registry=None, manifest=None):
+        """食物盒中的食物来自食物表，图片通过资源清单在资源目录中查找"""
         super().__init__()
+        self.food_registry = food_registry or FoodRegistry.from_file()
+        self.manifest = manifest
+        self.food_labels = []
         self.setWindowTitle("桌宠食物盒")
         self.resize(300, 200)
         
@@ -13,7 +21,7 @@ class FoodDragHelper(QMainWindow):
         main_layout = QVBoxLayout(central_widget)
         
         # 添加说明标签
-        instruction_label = QLabel("拖动下方的食物图标到桌宠上喂食")
+        instruction_label = QLabel("拖动下方的食物图标到桌宠上喂食\n按住 Ctrl 点击可以选中多个一起拖")
         instruction_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         main_layout.addWidget(instruction_label)
         
@@ -22,9 +30,8 @@ class FoodDragHelper(QMainWindow):
         food_layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
         
         # 添加食物图标
-        self.add_food_item(food_layout, "food_fish.png", "小鱼")
-        self.add_food_item(food_layout, "food_candy.png", "糖果")
-        self.add_food_item(food_layout, "food_apple.png", "苹果")
+        for food in self.food_registry.visible_foods():
+            self.add_food_item(food_layout, food)
         
         main_layout.addLayout(food_layout)
         
@@ -35,18 +42,25 @@ class FoodDragHelper(QMainWindow):
         
         self.setCentralWidget(central_widget)
     
-    def add_food_item(self, layout, image_path, name):
+    def image_path(self, image_name):
+        """食物图片的完整路径，没有资源清单或找不到时使用原文件名"""
+        if self.manifest is not None:
+            return self.manifest.resolve(image_name) or image_name
+        return image_name
+    
+    def add_food_item(self, layout, food):
         """添加一个可拖拽的食物图标"""
         try:
             container = QWidget()
             container_layout = QVBoxLayout(container)
             
             # 创建食物图标标签
-            food_label = DraggableLabel(image_path)
+            food_label = DraggableLabel(self.image_path(food.image), food.name, self)
             food_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+            self.food_labels.append(food_label)
             
             # 创建食物名称标签
-            name_label = QLabel(name)
+            name_label = QLabel(food.display_name)
             name_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
             
             container_layout.addWidget(food_label)
@@ -54,12 +68,21 @@ class FoodDragHelper(QMainWindow):
             
             layout.addWidget(container)
         except Exception as e:
-            print(f"添加食物项时出错: {e}")
+            logger.error("添加食物项时出错: %s", e)
+    
+    def drag_labels(self, label):
+        """从 label 开始拖动时一起拖走的食物：拖的是选中的食物时带上全部选中的，否则只拖这一个"""
+        if not label.selected:
+            return [label]
+        return [food_label for food_label in self.food_labels if food_label.selected]
 
 class DraggableLabel(QLabel):
-    def __init__(self, image_path):
+    def __init__(self, image_path, food_name, box=None):
         super().__init__()
         self.image_path = image_path
+        self.food_name = food_name
+        self.box = box
+        self.selected = False
         
         # 加载图片
         try:
@@ -69,34 +92,46 @@ class DraggableLabel(QLabel):
                 self.setPixmap(scaled_pixmap)
             else:
                 self.setText(f"无法加载: {image_path}")
-                print(f"错误: 无法加载图片 {image_path}")
+                logger.error("无法加载图片 %s", image_path)
         except Exception as e:
             self.setText(f"错误: {str(e)}")
-            print(f"加载图片时出错: {e}")
+            logger.error("加载图片时出错: %s", e)
+    
+    def set_selected(self, selected):
+        """选中或取消选中，选中的食物显示边框"""
+        self.selected = selected
+        self.setStyleSheet("border: 2px solid #3a8ee6; border-radius: 4px;" if selected else "")
     
     def mousePressEvent(self, event):
         if event.button() == Qt.MouseButton.LeftButton:
             self.drag_start_position = event.position().toPoint()
+            
+            # Ctrl+点击切换选中状态
+            if event.modifiers() & Qt.KeyboardModifier.ControlModifier:
+                self.set_selected(not self.selected)
     
     def mouseMoveEvent(self, event):
         # 检查是否是拖动操作
         if not (event.buttons() & Qt.MouseButton.LeftButton):
             return
-            
+        
         # 检查移动距离是否足够触发拖动
         if (event.position().toPoint() - self.drag_start_position).manhattanLength() < 10:
             return
-            
+        
         # 创建拖放操作
         drag = QDrag(self)
         mime_data = QMimeData()
         
-        # 设置拖放的数据为图片路径
-        mime_data.setText(self.image_path)
+        # 拖放的数据是按行分隔的食物名，同时作为文本提供给其他程序
+        labels = self.box.drag_labels(self) if self.box is not None else [self]
+        names = "\n".join(label.food_name for label in labels)
+        mime_data.setData(FOOD_MIME_TYPE, names.encode("utf-8"))
+        mime_data.setText(names)
         drag.setMimeData(mime_data)
         
-        # 设置拖放时显示的图像
-        pixmap = self.pixmap()
+        # 设置拖放时显示的图像，多个食物时叠在一起
+        pixmap = stack_pixmaps([label.pixmap() for label in labels])
         if not pixmap.isNull():
             drag.setPixmap(pixmap)
             drag.setHotSpot(QPoint(pixmap.width() // 2, pixmap.height() // 2))
@@ -104,6 +139,24 @@ class DraggableLabel(QLabel):
         # 执行拖放操作
         drag.exec(Qt.DropAction.CopyAction)
 
+def stack_pixmaps(pixmaps, offset=8, limit=4):
+    """把几张图片错开叠成一张，用作拖动多个食物时的图像"""
+    pixmaps = [pixmap for pixmap in pixmaps if pixmap is not None and not pixmap.isNull()][:limit]
+    if not pixmaps:
+        return QPixmap()
+    if len(pixmaps) == 1:
+        return pixmaps[0]
+    extra = offset * (len(pixmaps) - 1)
+    width = max(pixmap.width() for pixmap in pixmaps) + extra
+    height = max(pixmap.height() for pixmap in pixmaps) + extra
+    stacked = QPixmap(width, height)
+    stacked.fill(Qt.GlobalColor.transparent)
+    painter = QPainter(stacked)
+    for index, pixmap in enumerate(pixmaps):
+        painter.drawPixmap(index * offset, index * offset, pixmap)
+    painter.end()
+    return stacked
+
 # 独立运行测试
 if __name__ == "__main__":
     import sys
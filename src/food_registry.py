@@ -0,0 +1,105 @@
+import os
+import json
+
+DEFAULT_DEFINITION = os.path.join(os.path.dirname(os.path.abspath(__file__)), "foods.json")
+
+# 食物盒拖出的数据类型，内容是按行分隔的食物名
+FOOD_MIME_TYPE = "application/x-vpet-food"
+
+# 吃下食物后可以变成的心情
+FOOD_MOODS = ("normal", "happy")
+
+class Food:
+    """一种食物：显示信息、吃的动画事件、心情效果和气泡"""
+    def __init__(self, name, info):
+        self.name = name
+        self.display_name = info.get("display_name") or name
+        self.image = info.get("image")
+        self.aliases = list(info.get("aliases", []))
+        self.extensions = [ext.lower() for ext in info.get("extensions", [])]
+        self.mime_types = [mime.lower() for mime in info.get("mime_types", [])]
+        
+        # 吃的时候发给动画状态机的事件
+        self.animation = info.get("animation", "eat")
+        
+        # 心情效果：吃完后的心情，和愉快心情持续时间的倍数
+        self.mood = info.get("mood", "happy")
+        if self.mood not in FOOD_MOODS:
+            raise ValueError(f"食物 {name} 的心情无效: {self.mood}")
+        self.happy_boost = float(info.get("happy_boost", 1.0))
+        
+        # 吃的时候显示的气泡：情绪名或图片文件名
+        self.bubble = info.get("bubble", "food")
+
+class FoodRegistry:
+    """从定义文件读取的食物表
+
+    启动时把食物名、图片文件名、别名、文件扩展名和 MIME 类型都建成小写索引，
+    拖放时每个名字的匹配都是常数次字典查询，不再逐个做子串比较。
+    """
+    def __init__(self, definition):
+        self.foods = {}
+        for name, info in definition["foods"].items():
+            self.foods[name.lower()] = Food(name.lower(), info)
+        if not self.foods:
+            raise ValueError("没有定义任何食物")
+        
+        default = str(definition.get("default", next(iter(self.foods)))).lower()
+        if default not in self.foods:
+            raise ValueError(f"默认食物不存在: {default}")
+        self.default = self.foods[default]
+        
+        # 名字 -> 食物；扩展名 -> 食物；MIME 类型 -> 食物
+        self.names = {}
+        self.extensions = {}
+        self.mime_types = {}
+        for food in self.foods.values():
+            keys = [food.name, food.display_name] + food.aliases
+            if food.image:
+                keys += [food.image, os.path.splitext(food.image)[0]]
+            for key in keys:
+                self.add_index(self.names, key.lower(), food, "名字")
+            for ext in food.extensions:
+                self.add_index(self.extensions, ext, food, "扩展名")
+            for mime in food.mime_types:
+                self.add_index(self.mime_types, mime, food, "MIME 类型")
+    
+    @staticmethod
+    def add_index(index, key, food, kind):
+        """登记一个索引项，不同食物不能共用同一个名字"""
+        other = index.get(key)
+        if other is not None and other is not food:
+            raise ValueError(f"食物 {other.name} 和 {food.name} 的{kind}重复: {key}")
+        index[key] = food
+    
+    @classmethod
+    def from_file(cls, path=DEFAULT_DEFINITION):
+        """读取食物定义文件"""
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+    
+    def get(self, name):
+        """按食物名返回食物，没有时返回 None"""
+        return self.foods.get(name.lower())
+    
+    def visible_foods(self):
+        """有图片、可以放进食物盒的食物"""
+        return [food for food in self.foods.values() if food.image]
+    
+    def match(self, text):
+        """按名字、别名或文件名（路径）匹配食物，都不匹配时按扩展名匹配"""
+        key = text.strip().lower()
+        if not key:
+            return None
+        food = self.names.get(key)
+        if food is not None:
+            return food
+        
+        # 文件路径或 URL：先匹配文件名和去掉扩展名的部分，再匹配扩展名
+        base = key.replace("\\", "/").rsplit("/", 1)[-1]
+        stem, ext = os.path.splitext(base)
+        return self.names.get(base) or self.names.get(stem) or self.extensions.get(ext)
+    
+    def match_mime(self, mime_type):
+        """按 MIME 类型匹配食物（例如从浏览器拖来的图片数据）"""
+        return self.mime_types.get(mime_type.lower())
@@ -0,0 +1,68 @@
+from PyQt6.QtGui import QImage
+
+# 透明度不超过该值的像素视为透明（点击穿透）
+ALPHA_THRESHOLD = 16
+
+# 每个字节的透明度对应的 "0"/"1" 字符，用于把一行像素一次性转换成位串
+ALPHA_TO_BIT = bytes(ord("1") if alpha > ALPHA_THRESHOLD else ord("0") for alpha in range(256))
+
+TRANSPARENT = "transparent"
+HEAD = "head"
+BODY = "body"
+
+class HitMask:
+    """一帧图像的点击区域：不透明像素的位图和头部/身体的分界
+
+    每行像素存成一个整数位集（第 x 位对应第 x 列），查询只需一次移位；
+    头部是不透明部分最上方 head_ratio 的高度，其余不透明像素是身体。
+    坐标使用原始图像的像素，与显示时的缩放无关。
+    """
+    def __init__(self, width, height, rows, head_limit):
+        self.width = width
+        self.height = height
+        self.rows = rows
+        self.head_limit = head_limit
+    
+    @classmethod
+    def from_image(cls, image, head_ratio=0.4):
+        """从 QImage 生成点击区域（QImage 可以在工作线程中使用）"""
+        alpha = image.convertToFormat(QImage.Format.Format_Alpha8)
+        width = alpha.width()
+        height = alpha.height()
+        stride = alpha.bytesPerLine()
+        bits = alpha.constBits()
+        bits.setsize(alpha.sizeInBytes())
+        data = bits.asstring()
+        
+        rows = []
+        opaque_rows = []
+        for y in range(height):
+            row = data[y * stride:y * stride + width].translate(ALPHA_TO_BIT)
+            # 反转后最低位对应第 0 列
+            value = int(row[::-1], 2) if width else 0
+            rows.append(value)
+            if value:
+                opaque_rows.append(y)
+        
+        if opaque_rows:
+            top = opaque_rows[0]
+            head_limit = top + round((opaque_rows[-1] - top + 1) * head_ratio)
+        else:
+            head_limit = 0
+        return cls(width, height, rows, head_limit)
+    
+    def region(self, x, y):
+        """图像像素 (x, y) 所在的区域"""
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return TRANSPARENT
+        if not (self.rows[y] >> x) & 1:
+            return TRANSPARENT
+        return HEAD if y < self.head_limit else BODY
+    
+    def region_at(self, pos, rect):
+        """窗口坐标 pos 所在的区域，rect 是图像在窗口中的显示位置"""
+        if not rect.contains(pos):
+            return TRANSPARENT
+        x = int((pos.x() - rect.x()) * self.width / rect.width())
+        y = int((pos.y() - rect.y()) * self.height / rect.height())
+        return self.region(x, y)
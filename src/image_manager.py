@@ -1,16 +1,63 @@
 import os
 import sys
 import random
-from PyQt6.QtGui import QPixmap
+from PyQt6.QtGui import QPixmap, QGuiApplication
+from skin_loader import SkinLoader
+from sprite_atlas import SpriteAtlas
+from asset_store import AssetStore
+from state_machine import StateMachine
+from instrumentation import get_instrumentation
+from pixel_art import scale_sprite
+from hit_mask import HitMask
+from animated_sprite import AnimatedSprite, ANIMATED_EXTENSIONS
+from logger import get_logger
+
+logger = get_logger("image_manager")
 
 class ImageManager:
-    def __init__(self):
+    def __init__(self, state_machine=None, asset_store=None, skin=None, scale_factor=1.0):
+        # 动画状态机定义（状态、帧列表）
+        self.state_machine = state_machine or StateMachine.from_file()
+        
         # 当前选择的皮肤
         self.current_skin = "default"
-        self.available_skins = ["default", "hat", "scarf", "glasses"]
         
-        # 首次启动时随机选择一个皮肤
-        self.randomize_skin()
+        # 当前皮肤的图集（如果资源目录中有打包好的图集）
+        self.atlas = None
+        
+        # 显示尺寸：基础边长 100 像素乘以缩放比例
+        self.base_size = 100
+        self.scale_factor = scale_factor
+        
+        # 高分屏按物理像素缩放，像素画保持清晰
+        screen = QGuiApplication.primaryScreen()
+        self.device_pixel_ratio = screen.devicePixelRatio() if screen else 1.0
+        
+        # 性能统计
+        self.instrumentation = get_instrumentation()
+        
+        # 解码并缩放后的帧缓存，多只桌宠共用同一个资源库
+        self.asset_store = asset_store or AssetStore()
+        self.frame_cache = self.asset_store.frame_cache
+        
+        # 资源清单：所有图片都按资源目录解析，不依赖当前工作目录
+        self.manifest = self.asset_store.manifest
+        self.asset_dir = self.manifest.asset_dir
+        
+        # 皮肤注册表：内置皮肤和皮肤包，启动时只读取描述信息
+        frame_names = {frame for frames in self.state_machine.frame_names for frame in frames}
+        self.skins = self.asset_store.get_skin_registry(frame_names)
+        self.available_skins = self.skins.names()
+        
+        # 后台皮肤加载器，加载完成后切换皮肤
+        self.skin_loader = SkinLoader()
+        self.skin_loader.skin_loaded.connect(self.apply_loaded_skin)
+        
+        # 沿用上次保存的皮肤，首次启动时随机选择一个
+        if skin in self.available_skins:
+            self.current_skin = skin
+        else:
+            self.randomize_skin()
         
         # 定义不同状态的图片集
         self.load_skin_images()
@@ -25,128 +72,317 @@ class ImageManager:
         
         # 验证所有图片文件
         self.verify_images()
+        
+        # 登记正在使用的皮肤和缩放比例
+        self.asset_store.acquire(self.current_skin, self.scale_factor)
     
     def randomize_skin(self):
         """随机选择一个皮肤"""
         self.current_skin = random.choice(self.available_skins)
-        print(f"已选择皮肤: {self.current_skin}")
+        logger.info("已选择皮肤: %s", self.current_skin)
     
-    def set_skin(self, skin_name):
-        """设置特定皮肤"""
+    def set_skin(self, skin_name, animations=None):
+        """设置特定皮肤，animations 是后台线程中已经扫描好的动画文件"""
         if skin_name in self.available_skins:
+            # 先登记新皮肤再释放旧皮肤，没有桌宠使用的旧皮肤帧会被清出缓存
+            self.asset_store.acquire(skin_name, self.scale_factor)
+            self.asset_store.release(self.current_skin, self.scale_factor)
             self.current_skin = skin_name
-            self.load_skin_images()
-            print(f"已切换皮肤: {self.current_skin}")
+            self.load_skin_images(animations)
+            logger.info("已切换皮肤: %s", self.current_skin)
             return True
         return False
     
-    def load_skin_images(self):
-        """加载当前皮肤的所有图片集"""
-        skin_prefix = "" if self.current_skin == "default" else f"{self.current_skin}_"
-        
-        # 基本状态图片
-        self.idle_images = [f"{skin_prefix}idle1.png", f"{skin_prefix}idle3.png", 
-                           f"{skin_prefix}idle1.png", f"{skin_prefix}idle2.png"]
-        self.walk_images = [f"{skin_prefix}walk1.png", f"{skin_prefix}walk2.png", 
-                           f"{skin_prefix}walk3.png", f"{skin_prefix}walk2.png"]
-        self.click_images = [f"{skin_prefix}shock1.png", f"{skin_prefix}shock2.png"]
-        
-        # 新增的状态图片
-        self.sleep_images = [f"{skin_prefix}sleep1.png", f"{skin_prefix}sleep2.png"]
-        self.blink_images = [f"{skin_prefix}blink1.png", f"{skin_prefix}blink2.png"]
-        self.stretch_images = [f"{skin_prefix}stretch1.png", f"{skin_prefix}stretch2.png"]
-        self.angry_images = [f"{skin_prefix}angry1.png", f"{skin_prefix}angry2.png"]
-        self.headpat_images = [f"{skin_prefix}headpat1.png", f"{skin_prefix}headpat2.png"]
-        self.eating_images = [f"{skin_prefix}eat1.png", f"{skin_prefix}eat2.png", f"{skin_prefix}eat3.png"]
+    def load_skin_images(self, preloaded=None):
+        """加载当前皮肤的所有图片集，preloaded 中已扫描的动画文件不再在主线程中读取"""
+        # 有图集时整个皮肤只需打开和解码一张图片
+        self.atlas = self.asset_store.get_atlas(self.current_skin)
+        
+        # 各状态的图片列表，frame_table 按状态编号索引
+        skin = self.skins.get(self.current_skin)
+        self.skin_images = self.build_skin_images(skin, self.state_machine)
+        
+        # 有多帧动画文件（<状态名>.gif 等）的状态从动画文件中逐帧解码，帧数和时长也来自文件
+        self.animations = {}
+        self.animation_files = {}
+        for state_id, state in enumerate(self.state_machine.state_names):
+            file_name, source = self.find_animation(skin, state)
+            if source is None:
+                continue
+            animation = preloaded.get(file_name) if preloaded else None
+            if animation is None:
+                animation = AnimatedSprite(source)
+            if animation.frame_count == 0:
+                logger.error("无法解码动画 %s", file_name)
+                continue
+            self.animations[state_id] = animation
+            self.animation_files[file_name] = animation
+            self.skin_images[state] = [f"{file_name}#{frame}" for frame in range(animation.frame_count)]
+        
+        self.frame_table = [self.skin_images[name] for name in self.state_machine.state_names]
         
         # 对话气泡图片
         self.bubble_image = "bubble.png"
     
+    @staticmethod
+    def build_skin_images(skin, state_machine):
+        """根据状态机定义生成指定皮肤各状态的图片文件名列表"""
+        return {
+            name: [skin.image_name(frame) for frame in state_machine.frame_names[state_id]]
+            for name, state_id in state_machine.state_ids.items()
+        }
+    
+    def find_animation(self, skin, state):
+        """查找皮肤中状态对应的多帧动画文件，返回 (文件名, 路径或图片数据)"""
+        for ext in ANIMATED_EXTENSIONS:
+            file_name = f"{skin.prefix}{state}{ext}"
+            if skin.is_package:
+                if skin.has(file_name):
+                    return file_name, skin.path(file_name) or skin.read(file_name)
+            else:
+                path = self.manifest.resolve(file_name)
+                if path:
+                    return file_name, path
+        return None, None
+    
+    def frame_count(self, state_id):
+        """状态的帧数，动画文件的帧数优先于定义文件"""
+        animation = self.animations.get(state_id)
+        if animation is not None:
+            return animation.frame_count
+        return self.state_machine.frame_counts[state_id]
+    
+    def frame_duration(self, state_id, frame):
+        """帧的显示时长（毫秒），动画文件中的帧时长优先于定义文件"""
+        animation = self.animations.get(state_id)
+        if animation is not None:
+            return animation.frame_delay(frame)
+        return self.state_machine.frame_duration(state_id, frame)
+    
+    def preload_skin(self, skin_name):
+        """在后台线程预加载皮肤，全部解码完成后再原子地切换"""
+        if skin_name not in self.available_skins:
+            return False
+        
+        # 文件路径在主线程中解析好（zip 皮肤包读出图片数据），缺失的皮肤帧回退到默认皮肤图片
+        skin = self.skins.get(skin_name)
+        self.skins.use(skin_name)
+        frames = []
+        animations = {}
+        for state, images in self.build_skin_images(skin, self.state_machine).items():
+            # 有动画文件的状态不解码单帧图片，动画文件交给工作线程扫描，播放时才逐帧解码
+            file_name, source = self.find_animation(skin, state)
+            if source is not None:
+                animations[file_name] = source
+                continue
+            for frame, image_name in enumerate(images):
+                path = None
+                if skin.is_package:
+                    path = skin.path(image_name) or skin.read(image_name)
+                if path is None:
+                    path = self.manifest.resolve(image_name) or self.manifest.resolve(skin.fallback_name(image_name))
+                frames.append((state, frame, image_name, path))
+        
+        size = self.base_size * self.scale_factor
+        atlas = SpriteAtlas.find(self.manifest, skin_name)
+        self.skin_loader.load(skin_name, frames, self.scale_factor, size, atlas, self.device_pixel_ratio, animations)
+        return True
+    
+    def apply_loaded_skin(self, skin_name, scale_factor, images, masks, animations):
+        """后台加载完成后切换皮肤，并用已解码的帧、点击区域和扫描好的动画填充缓存"""
+        self.set_skin(skin_name, animations)
+        for image_name, mask in masks.items():
+            self.asset_store.hit_masks.setdefault((skin_name, image_name), mask)
+        if scale_factor != self.scale_factor:
+            # 加载期间缩放比例已改变，解码结果不再适用
+            return
+        for (state, frame), image in images.items():
+            key = (skin_name, state, frame, scale_factor)
+            self.frame_cache.put(key, QPixmap.fromImage(image))
+    
     def verify_images(self):
-        """验证所有图片文件是否存在"""
-        print(f"当前工作目录: {os.getcwd()}")
-        print(f"当前皮肤: {self.current_skin}")
-        
-        # 收集所有可能的图片路径
-        all_images = []
-        all_images.extend(self.idle_images)
-        all_images.extend(self.walk_images)
-        all_images.extend(self.click_images)
-        all_images.extend(self.sleep_images)
-        all_images.extend(self.blink_images)
-        all_images.extend(self.stretch_images)
-        all_images.extend(self.angry_images)
-        all_images.extend(self.headpat_images)
-        all_images.extend(self.eating_images)
-        all_images.append(self.bubble_image)
+        """验证所有图片文件是否存在（只查询资源清单，不访问文件系统）"""
+        # 收集所有可能的图片
+        all_images = set()
+        for images in self.frame_table:
+            all_images.update(image.split("#")[0] for image in images)
+        all_images.add(self.bubble_image)
         
         # 添加情绪气泡图片
-        all_images.extend(self.emotion_bubbles.values())
-        
-        # 检查哪些图片文件存在
-        missing_images = []
-        for img in all_images:
-            full_path = os.path.join(os.getcwd(), img)
-            if not os.path.exists(full_path):
-                missing_images.append(img)
-                print(f"警告：找不到图片文件 {full_path}")
-            else:
-                print(f"找到图片文件: {full_path}")
+        all_images.update(self.emotion_bubbles.values())
         
-        # 如果有缺失的图片，尝试使用默认皮肤
-        if missing_images and self.current_skin != "default":
-            print(f"尝试切换到默认皮肤")
-            self.current_skin = "default"
-            self.load_skin_images()
-            self.verify_images()
+        # 检查哪些图片不存在（皮肤包或图集中已有的帧也算存在）；
+        # 皮肤没有的帧在 load_image 中逐帧使用默认皮肤的图片，所以默认皮肤也没有时才算缺失
+        skin = self.skins.get(self.current_skin)
+        missing_images = sorted(
+            img for img in all_images
+            if not self.image_exists(skin, img) and not self.manifest.exists(skin.fallback_name(img))
+        )
+        logger.debug("资源目录: %s, 皮肤: %s, 共 %d 个图片, 缺失 %d 个",
+                     self.asset_dir, self.current_skin, len(all_images), len(missing_images))
+        if missing_images:
+            logger.warning("皮肤 %s 找不到图片文件 %s", self.current_skin, ", ".join(missing_images))
+    
+    def image_exists(self, skin, image_path):
+        """皮肤包、图集或资源清单中有这个图片"""
+        return (skin.has(image_path) or self.manifest.exists(image_path)
+                or bool(self.atlas and self.atlas.has_frame(image_path)))
+    
+    def decode_file(self, path):
+        """解码图片文件，path 为 None 时返回空图像"""
+        if not path:
+            return QPixmap()
+        self.instrumentation.count("decode")
+        return QPixmap(path)
     
     def load_image(self, image_path):
         """加载并返回图像"""
-        try:
-            pixmap = QPixmap(image_path)
-            if pixmap.isNull():
-                print(f"错误：无法加载图片 {image_path}")
-                # 尝试加载相应的默认皮肤图片
-                if self.current_skin != "default":
-                    default_image = image_path.replace(f"{self.current_skin}_", "")
-                    print(f"尝试加载默认皮肤图片: {default_image}")
-                    pixmap = QPixmap(default_image)
-                    if not pixmap.isNull():
+        # 已经确认找不到的图片直接返回，不再重复查找和解码
+        missing_key = (self.current_skin, image_path)
+        if missing_key in self.asset_store.missing:
+            return None
+        
+        with self.instrumentation.measure("load_image"):
+            try:
+                # 皮肤包中的图片优先
+                skin = self.skins.get(self.current_skin)
+                if skin.is_package:
+                    data = skin.read(image_path)
+                    pixmap = QPixmap()
+                    if data is not None:
+                        self.instrumentation.count("decode")
+                        if pixmap.loadFromData(data):
+                            return pixmap
+                
+                # 其次从图集中截取子图
+                if self.atlas and self.atlas.has_frame(image_path):
+                    pixmap = self.atlas.get_pixmap(image_path)
+                    if pixmap is not None:
                         return pixmap
+                
+                path = self.manifest.resolve(image_path)
+                pixmap = self.decode_file(path)
+                if pixmap.isNull():
+                    # 尝试加载相应的默认皮肤图片
+                    if self.current_skin != "default":
+                        default_image = skin.fallback_name(image_path)
+                        default_path = self.manifest.resolve(default_image)
+                        pixmap = self.decode_file(default_path)
+                        if not pixmap.isNull():
+                            logger.debug("皮肤 %s 没有图片 %s，使用默认皮肤图片 %s",
+                                         self.current_skin, image_path, default_image)
+                            return pixmap
+                    logger.warning("无法加载图片 %s", image_path)
+                    self.asset_store.missing.add(missing_key)
+                    return None
+                return pixmap
+            except Exception as e:
+                logger.error("加载图片 %s 时出错: %s", image_path, e)
+                self.asset_store.missing.add(missing_key)
                 return None
-            return pixmap
-        except Exception as e:
-            print(f"加载图片时出错: {e}")
-            return None
     
     def get_image_for_state(self, state, frame):
         """根据状态和帧索引返回对应的图像路径"""
-        if state == "idle" and frame < len(self.idle_images):
-            return self.idle_images[frame]
-        elif state == "walk" and frame < len(self.walk_images):
-            return self.walk_images[frame]
-        elif state == "click" and frame < len(self.click_images):
-            return self.click_images[frame]
-        elif state == "sleep" and frame < len(self.sleep_images):
-            return self.sleep_images[frame % len(self.sleep_images)]
-        elif state == "blink" and frame < len(self.blink_images):
-            return self.blink_images[frame % len(self.blink_images)]
-        elif state == "stretch" and frame < len(self.stretch_images):
-            return self.stretch_images[frame % len(self.stretch_images)]
-        elif state == "angry" and frame < len(self.angry_images):
-            return self.angry_images[frame % len(self.angry_images)]
-        elif state == "headpat" and frame < len(self.headpat_images):
-            return self.headpat_images[frame % len(self.headpat_images)]
-        elif state == "eating" and frame < len(self.eating_images):
-            return self.eating_images[frame % len(self.eating_images)]
-        return None
+        state_id = self.state_machine.state_ids.get(state)
+        if state_id is None:
+            return None
+        images = self.frame_table[state_id]
+        return images[frame % len(images)]
+    
+    def set_scale_factor(self, scale_factor):
+        """设置缩放比例，旧比例的帧在没有桌宠使用后失效"""
+        if scale_factor == self.scale_factor:
+            return False
+        self.asset_store.acquire(self.current_skin, scale_factor)
+        self.asset_store.release(self.current_skin, self.scale_factor)
+        self.scale_factor = scale_factor
+        return True
+    
+    def get_frame_key(self, state, frame):
+        """返回帧的显示标识，相同标识的帧画面完全相同"""
+        return (self.current_skin, self.get_image_for_state(state, frame), self.scale_factor)
+    
+    def get_frame(self, state, frame):
+        """返回可直接显示的帧图像（已解码并缩放），优先从缓存读取"""
+        # 动画文件中的帧不进共用的帧缓存，由动画自己的环形缓冲区保留最近几帧
+        animation = self.animations.get(self.state_machine.state_ids.get(state))
+        if animation is not None:
+            size = self.base_size * self.scale_factor
+            return animation.frame(frame, ("scaled", size, self.device_pixel_ratio), lambda image: QPixmap.fromImage(
+                scale_sprite(image, size, self.device_pixel_ratio)))
+        
+        key = (self.current_skin, state, frame, self.scale_factor)
+        pixmap = self.frame_cache.get(key)
+        if pixmap is not None:
+            return pixmap
+        
+        image_path = self.get_image_for_state(state, frame)
+        if not image_path:
+            return None
+        source = self.get_source_image(image_path)
+        if source is None:
+            return None
+        
+        # 像素画使用最近邻缩放，缩放比例变化时只需从原始帧重新缩放
+        pixmap = scale_sprite(source, self.base_size * self.scale_factor, self.device_pixel_ratio)
+        self.frame_cache.put(key, pixmap)
+        return pixmap
+    
+    def get_source_image(self, image_path):
+        """返回解码后未缩放的原始帧，每个皮肤的每个文件只解码一次"""
+        if "#" in image_path:
+            file_name, frame = image_path.rsplit("#", 1)
+            animation = self.animation_files.get(file_name)
+            if animation is None:
+                return None
+            return animation.frame(int(frame), "source", QPixmap.fromImage)
+        
+        key = (self.current_skin, image_path)
+        pixmap = self.asset_store.source_cache.get(key)
+        if pixmap is None:
+            pixmap = self.load_image(image_path)
+            if pixmap is not None:
+                self.asset_store.source_cache.put(key, pixmap)
+        return pixmap
+    
+    def get_hit_mask(self, state, frame):
+        """返回帧的点击区域，每个皮肤的每个文件只生成一次"""
+        image_path = self.get_image_for_state(state, frame)
+        if not image_path:
+            return None
+        key = (self.current_skin, image_path)
+        mask = self.asset_store.hit_masks.get(key)
+        if mask is None:
+            source = self.get_source_image(image_path)
+            if source is None:
+                return None
+            mask = HitMask.from_image(source.toImage())
+            self.asset_store.hit_masks[key] = mask
+        return mask
+    
+    def get_overlay_image(self, image_path, max_size):
+        """返回缩放到 max_size 以内的气泡图像，按图片、尺寸和缩放比例缓存"""
+        key = ("overlay", image_path, (max_size.width(), max_size.height()), self.scale_factor)
+        pixmap = self.frame_cache.get(key)
+        if pixmap is not None:
+            return pixmap
+        
+        source = self.load_image(image_path)
+        if source is None:
+            return None
+        ratio = min(max_size.width() / source.width(), max_size.height() / source.height())
+        pixmap = scale_sprite(source, max(source.width(), source.height()) * ratio, self.device_pixel_ratio)
+        self.frame_cache.put(key, pixmap)
+        return pixmap
     
     def get_bubble_image(self):
         """返回气泡图像路径"""
         return self.bubble_image
     
     def get_emotion_bubble(self, emotion):
-        """返回情绪气泡图像路径"""
+        """返回情绪气泡图像路径，也可以直接给出图片文件名（例如食物自己的气泡）"""
         if emotion in self.emotion_bubbles:
             return self.emotion_bubbles[emotion]
+        if os.path.splitext(emotion)[1]:
+            return emotion
         return None
\ No newline at end of file
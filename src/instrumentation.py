@@ -0,0 +1,168 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from contextlib import nullcontext
+from PyQt6.QtWidgets import QLabel
+from PyQt6.QtCore import Qt, QTimer, QPoint
+from logger import get_logger
+
+logger = get_logger("instrumentation")
+
+# 未启用时 measure() 返回的空上下文，几乎没有开销
+NULL_MEASURE = nullcontext()
+
+class TimingStats:
+    """一类事件的耗时统计（秒）"""
+    def __init__(self, window=256):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=window)
+    
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.recent.append(seconds)
+    
+    def summary(self):
+        """返回毫秒为单位的统计摘要，p95 基于最近的样本"""
+        recent = sorted(self.recent)
+        p95 = recent[min(len(recent) - 1, int(len(recent) * 0.95))] if recent else 0.0
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "p95_ms": p95 * 1000,
+            "max_ms": self.max * 1000
+        }
+
+class Measure:
+    """记录一段代码耗时的上下文管理器"""
+    def __init__(self, stats):
+        self.stats = stats
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.stats.add(time.perf_counter() - self.start)
+        return False
+
+class Instrumentation:
+    """帧耗时与事件循环延迟统计"""
+    def __init__(self):
+        self.enabled = False
+        self.timings = {}
+        self.lags = {}
+        self.started_at = time.monotonic()
+        
+        # 事件计数（例如图片解码次数），很便宜所以总是统计；皮肤加载线程也会计数
+        self.counters = {}
+        self.counter_lock = threading.Lock()
+    
+    def measure(self, name):
+        """用法: with instrumentation.measure("update_image"): ..."""
+        if not self.enabled:
+            return NULL_MEASURE
+        stats = self.timings.get(name)
+        if stats is None:
+            stats = self.timings[name] = TimingStats()
+        return Measure(stats)
+    
+    def record_lag(self, name, seconds):
+        """记录定时任务实际触发时间比预定时间晚了多少"""
+        if not self.enabled:
+            return
+        stats = self.lags.get(name)
+        if stats is None:
+            stats = self.lags[name] = TimingStats()
+        stats.add(max(0.0, seconds))
+    
+    def count(self, name, n=1):
+        """事件计数加 n，可以在工作线程中调用"""
+        with self.counter_lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+    
+    def reset(self):
+        self.timings.clear()
+        self.lags.clear()
+        with self.counter_lock:
+            self.counters.clear()
+        self.started_at = time.monotonic()
+    
+    def snapshot(self):
+        """返回当前所有统计数据"""
+        return {
+            "elapsed_s": time.monotonic() - self.started_at,
+            "timings": {name: stats.summary() for name, stats in self.timings.items()},
+            "timer_lag": {name: stats.summary() for name, stats in self.lags.items()},
+            "counters": dict(self.counters)
+        }
+    
+    def dump(self, path):
+        """把统计数据写入 JSON 文件"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+        logger.info("性能数据已导出到: %s", path)
+    
+    def format_text(self):
+        """生成在浮层中显示的简要文本"""
+        lines = []
+        for name, stats in sorted(self.timings.items()):
+            s = stats.summary()
+            lines.append(f"{name:<18} {s['mean_ms']:6.2f} {s['p95_ms']:6.2f} {s['max_ms']:6.2f}")
+        if self.lags:
+            lines.append("定时器延迟")
+            for name, stats in sorted(self.lags.items()):
+                s = stats.summary()
+                lines.append(f"{name:<18} {s['mean_ms']:6.2f} {s['p95_ms']:6.2f} {s['max_ms']:6.2f}")
+        header = f"{'耗时(ms)':<16} {'均值':>6} {'p95':>6} {'最大':>6}"
+        return "\n".join([header] + lines)
+
+_instrumentation = None
+
+def get_instrumentation():
+    """返回进程内共享的统计对象，设置环境变量 VPET_INSTRUMENT=1 时默认启用"""
+    global _instrumentation
+    if _instrumentation is None:
+        _instrumentation = Instrumentation()
+        _instrumentation.enabled = os.environ.get("VPET_INSTRUMENT", "") not in ("", "0")
+    return _instrumentation
+
+class InstrumentationOverlay(QLabel):
+    """显示在桌宠旁边的性能统计浮层"""
+    def __init__(self, pet, instrumentation):
+        super().__init__(None)
+        self.pet = pet
+        self.instrumentation = instrumentation
+        
+        self.setWindowFlags(
+            Qt.WindowType.FramelessWindowHint |
+            Qt.WindowType.WindowStaysOnTopHint |
+            Qt.WindowType.Tool |
+            Qt.WindowType.WindowTransparentForInput
+        )
+        self.setStyleSheet("background-color: rgba(0, 0, 0, 180); color: #8f8; "
+                           "font-family: Menlo, monospace; font-size: 10px; padding: 4px;")
+        
+        # 每秒刷新一次，只在浮层可见时运行
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh)
+    
+    def showEvent(self, event):
+        self.refresh_timer.start(1000)
+        self.refresh()
+        super().showEvent(event)
+    
+    def hideEvent(self, event):
+        self.refresh_timer.stop()
+        super().hideEvent(event)
+    
+    def refresh(self):
+        self.setText(self.instrumentation.format_text())
+        self.adjustSize()
+        self.move(self.pet.geometry().topRight() + QPoint(8, 0))
@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+import logging
+from collections import OrderedDict
+
+# 所有模块的日志都挂在这个名字下面
+ROOT_LOGGER = "vpet"
+
+class RepeatFilter(logging.Filter):
+    """去重和限流
+
+    同一条日志（同一模板和参数）在 window 秒内只输出一次，之后再次输出时
+    附带中间被省略的次数；每秒最多输出 rate 条，超出的部分丢弃并计数。
+    """
+    def __init__(self, window=60.0, rate=10, burst=20, max_keys=256):
+        super().__init__()
+        self.window = window
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        
+        # 日志 -> [上次输出时间, 省略次数]
+        self.recent = OrderedDict()
+        
+        # 令牌桶
+        self.tokens = burst
+        self.last_refill = time.monotonic()
+        self.dropped = 0
+    
+    def filter(self, record):
+        now = time.monotonic()
+        key = (record.name, record.levelno, record.msg, repr(record.args))
+        entry = self.recent.get(key)
+        if entry is not None and now - entry[0] < self.window:
+            entry[1] += 1
+            return False
+        
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+        if self.tokens < 1:
+            self.dropped += 1
+            return False
+        self.tokens -= 1
+        
+        notes = []
+        if entry is not None and entry[1]:
+            notes.append(f"省略了 {entry[1]} 条重复日志")
+        if self.dropped:
+            notes.append(f"限流丢弃了 {self.dropped} 条日志")
+            self.dropped = 0
+        if notes:
+            record.msg = f"{record.getMessage()}（{'，'.join(notes)}）"
+            record.args = None
+        
+        self.recent[key] = [now, 0]
+        self.recent.move_to_end(key)
+        while len(self.recent) > self.max_keys:
+            self.recent.popitem(last=False)
+        return True
+
+def setup_logging(level=None):
+    """配置日志输出，级别默认取环境变量 VPET_LOG_LEVEL（DEBUG/INFO/WARNING/ERROR），未设置时为 INFO"""
+    root = logging.getLogger(ROOT_LOGGER)
+    level = level or os.environ.get("VPET_LOG_LEVEL", "INFO")
+    root.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+    if not root.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s", "%H:%M:%S"))
+        handler.addFilter(RepeatFilter())
+        root.addHandler(handler)
+        root.propagate = False
+    return root
+
+def get_logger(name):
+    """返回模块的日志记录器，第一次调用时完成配置"""
+    root = logging.getLogger(ROOT_LOGGER)
+    if not root.handlers:
+        setup_logging()
+    return root.getChild(name)
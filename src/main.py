@@ -1,11 +1,63 @@
+import time
+
+# 进程启动时间，用于统计首帧耗时
+STARTUP_TIME = time.perf_counter()
+
+import os
 import sys
 from PyQt6.QtWidgets import QApplication
-from pixel_pet import PixelPet
+from logger import get_logger
+
+logger = get_logger("main")
+
+def pet_count():
+    """桌宠数量：命令行参数 --pets N 或环境变量 VPET_PETS，默认 1"""
+    value = os.environ.get("VPET_PETS", "1")
+    if "--pets" in sys.argv:
+        index = sys.argv.index("--pets")
+        if index + 1 < len(sys.argv):
+            value = sys.argv[index + 1]
+    try:
+        return max(1, int(value))
+    except ValueError:
+        logger.warning("无效的桌宠数量: %s", value)
+        return 1
+
+def create_pets(count, startup_time=None):
+    """创建多只桌宠，共用资源库、调度器、状态机和食物表"""
+    # 在 QApplication 创建之后才导入桌宠模块
+    from PyQt6.QtCore import QPoint
+    from pixel_pet import PixelPet
+    from asset_store import AssetStore
+    from scheduler import Scheduler
+    from state_machine import StateMachine
+    from food_registry import FoodRegistry
+    from state_store import StateStore, default_state_path
+    
+    if count == 1:
+        return [PixelPet(startup_time=startup_time)]
+    
+    asset_store = AssetStore(max_frames=256)
+    scheduler = Scheduler()
+    state_machine = StateMachine.from_file()
+    food_registry = FoodRegistry.from_file()
+    
+    pets = []
+    columns = max(1, int(count ** 0.5))
+    for index in range(count):
+        pet = PixelPet(asset_store, scheduler, state_machine, startup_time,
+                       StateStore(default_state_path(index)), food_registry)
+        # 没有保存过位置的桌宠以屏幕中央为起点按网格排开
+        if not pet.restored_position:
+            offset = QPoint((index % columns) * pet.width(), (index // columns) * pet.height())
+            pet.move(pet.pos() + offset)
+        pets.append(pet)
+    return pets
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
-    print("创建 QApplication 实例")
+    logger.debug("创建 QApplication 实例")
     
-    pet = PixelPet()
-    print("正在进入事件循环...")
-    sys.exit(app.exec())
\ No newline at end of file
+    pets = create_pets(pet_count(), STARTUP_TIME)
+    logger.debug("正在进入事件循环...")
+    sys.exit(app.exec())
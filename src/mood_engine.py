@@ -0,0 +1,111 @@
+import time
+
+class MoodEngine:
+    """根据距离上次互动的时间推算心情和睡眠变化
+
+    使用单调时钟，不受跨午夜和系统时间调整影响。不做周期性轮询：
+    每次只为最近的一个阈值预约一次唤醒，所有阈值都已触发后不再唤醒，
+    直到下一次互动重新开始计时。
+    """
+    # 各阈值距上次互动的秒数：愉快恢复正常、变得无聊、进入睡眠
+    DEFAULT_THRESHOLDS = {
+        "happy_decay": 60,
+        "bored": 180,
+        "sleep": 600,
+    }
+    
+    def __init__(self, scheduler, key, on_threshold, thresholds=None):
+        self.scheduler = scheduler
+        self.key = key
+        self.on_threshold = on_threshold
+        
+        self.thresholds = dict(self.DEFAULT_THRESHOLDS)
+        if thresholds:
+            self.thresholds.update(thresholds)
+        
+        # 已关闭的阈值（例如关闭睡眠检查）
+        self.disabled = set()
+        
+        # 本轮（上次互动以来）已触发的阈值
+        self.fired = set()
+        self.last_interaction = time.monotonic()
+        self.running = False
+    
+    def start(self):
+        """开始计时并预约第一个阈值"""
+        self.running = True
+        self.reschedule()
+    
+    def stop(self):
+        """停止计时，取消已预约的唤醒"""
+        self.running = False
+        self.scheduler.cancel(self.key)
+    
+    def touch(self):
+        """记录一次互动，所有阈值重新开始计时"""
+        self.last_interaction = time.monotonic()
+        self.fired.clear()
+        self.reschedule()
+    
+    def restore(self, idle_seconds):
+        """从存档恢复：已经闲置了 idle_seconds 秒
+
+        已越过的阈值视为已触发，不再预约，按到期先后返回它们的名字，
+        由调用者补上这些阈值的效果；之后只预约还没到期的阈值。
+        """
+        self.last_interaction = time.monotonic() - idle_seconds
+        self.fired.clear()
+        elapsed = [name for seconds, name in self.pending_thresholds() if seconds <= idle_seconds]
+        self.fired.update(elapsed)
+        self.reschedule()
+        return elapsed
+    
+    def idle_seconds(self):
+        """距离上次互动的秒数"""
+        return time.monotonic() - self.last_interaction
+    
+    def set_threshold(self, name, seconds):
+        """修改阈值，已触发过的阈值在下次互动前不会再次触发"""
+        self.thresholds[name] = seconds
+        self.reschedule()
+    
+    def set_enabled(self, name, enabled):
+        """开启或关闭某个阈值"""
+        if enabled:
+            self.disabled.discard(name)
+        else:
+            self.disabled.add(name)
+        self.reschedule()
+    
+    def pending_thresholds(self):
+        """本轮还未触发的阈值，按到期先后排列"""
+        pending = [
+            (seconds, name) for name, seconds in self.thresholds.items()
+            if name not in self.fired and name not in self.disabled
+        ]
+        pending.sort()
+        return pending
+    
+    def reschedule(self):
+        """为最近的一个未触发阈值预约唤醒，没有时取消唤醒"""
+        if not self.running:
+            return
+        pending = self.pending_thresholds()
+        if not pending:
+            self.scheduler.cancel(self.key)
+            return
+        
+        seconds = pending[0][0]
+        delay = max(0.0, seconds - self.idle_seconds())
+        # 向上取整，避免唤醒略早于阈值而多醒一次
+        self.scheduler.call_later(int(delay * 1000) + 1, self.on_deadline, key=self.key)
+    
+    def on_deadline(self):
+        """唤醒：触发所有已到期的阈值，再预约下一个"""
+        idle = self.idle_seconds()
+        for seconds, name in self.pending_thresholds():
+            if seconds > idle:
+                break
+            self.fired.add(name)
+            self.on_threshold(name)
+        self.reschedule()
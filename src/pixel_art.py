@@ -0,0 +1,30 @@
+from PyQt6.QtCore import Qt
+
+def snap_ratio(ratio, tolerance=0.08):
+    """像素画按整数倍（或整数分之一）缩放时像素边缘最整齐，比例接近时吸附过去"""
+    if ratio >= 1:
+        n = round(ratio)
+        if abs(ratio - n) <= tolerance * ratio:
+            return float(n)
+    else:
+        n = round(1 / ratio)
+        if n and abs(1 / ratio - n) <= tolerance / ratio:
+            return 1.0 / n
+    return ratio
+
+def scale_sprite(image, target_size, device_pixel_ratio=1.0):
+    """用最近邻插值缩放 QImage/QPixmap，使较长边约为 target_size 个逻辑像素
+
+    高分屏上按物理像素缩放并设置 devicePixelRatio，避免再被系统二次插值。
+    """
+    longest = max(image.width(), image.height())
+    if longest == 0:
+        return image
+    ratio = snap_ratio(target_size * device_pixel_ratio / longest)
+    width = max(1, round(image.width() * ratio))
+    height = max(1, round(image.height() * ratio))
+    
+    scaled = image.scaled(width, height, Qt.AspectRatioMode.IgnoreAspectRatio,
+                          Qt.TransformationMode.FastTransformation)
+    scaled.setDevicePixelRatio(device_pixel_ratio)
+    return scaled
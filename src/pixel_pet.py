@@ -1,53 +1,118 @@
-from PyQt6.QtWidgets import QLabel, QWidget, QMenu, QApplication
-from PyQt6.QtGui import QPixmap, QAction, QDragEnterEvent, QDropEvent
-from PyQt6.QtCore import Qt, QTimer, QPoint, QSize, QMimeData
+from PyQt6.QtWidgets import QWidget, QApplication
+from PyQt6.QtGui import QPixmap, QPainter, QRegion, QDragEnterEvent, QDropEvent
+from PyQt6.QtCore import Qt, QTimer, QPoint, QRect, QSize, QMimeData
 import os
+import time
+import random
 from image_manager import ImageManager
 from animation_manager import AnimationManager
+from instrumentation import get_instrumentation
+from state_store import StateStore
+from hit_mask import TRANSPARENT, HEAD, BODY
+from bubble_overlay import BubbleOverlay, SPEECH, EMOTION, EMOTION_PRIORITY, DEFAULT_EMOTION_PRIORITY
+from food_registry import FoodRegistry, FOOD_MIME_TYPE
+from logger import get_logger
+
+logger = get_logger("pixel_pet")
 
 class PixelPet(QWidget):
-    def __init__(self):
+    # "说话"时按心情挑选的台词
+    PHRASES = {
+        "normal": ["你好呀！", "今天过得怎么样？", "陪我玩一会儿吧~"],
+        "happy": ["好开心！", "最喜欢你了！", "嘿嘿~"],
+        "bored": ["好无聊啊……", "来陪我玩嘛！", "有没有好吃的？"],
+        "angry": ["哼！", "不要再折腾我了！", "我生气了！"],
+        "sleeping": ["Zzz……", "呼……呼……"],
+    }
+    
+    def __init__(self, asset_store=None, scheduler=None, state_machine=None, startup_time=None, state_store=None,
+                 food_registry=None):
+        """多只桌宠可以共用同一个资源库、调度器、状态机和食物表
+
+        startup_time 是进程启动时的 time.perf_counter()，用于统计首帧耗时。
+        state_store 是本桌宠的存档，多只桌宠时每只各用一个。
+        """
         super().__init__()
-        print("初始化 PixelPet...")
+        logger.debug("初始化 PixelPet...")
+        
+        # 首帧统计：首次绘制后才创建菜单、启动心情等后台任务
+        self.startup_time = startup_time if startup_time is not None else time.perf_counter()
+        self.time_to_first_frame_ms = None
+        self.startup_finished = False
+        
+        # 性能统计（右键菜单或环境变量 VPET_INSTRUMENT=1 开启）
+        self.instrumentation = get_instrumentation()
+        self.instrumentation_overlay = None
+        
+        # 存档：皮肤、大小、心情、设置和窗口位置
+        self.state_store = state_store or StateStore()
         
         # 设置窗口属性
         self.setup_window()
         
-        # 创建图像管理器
-        self.image_manager = ImageManager()
+        # 创建图像管理器，沿用上次保存的皮肤和大小
+        self.image_manager = ImageManager(state_machine, asset_store,
+                                          self.state_store.get("skin"), self.saved_scale_factor())
         
-        # 创建标签用于显示图像
-        self.setup_label()
+        # 创建画布：精灵和气泡都在同一个 paintEvent 中绘制
+        self.setup_canvas()
         
         # 创建动画管理器
-        self.animation_manager = AnimationManager(self, self.image_manager)
+        self.animation_manager = AnimationManager(self, self.image_manager, scheduler)
+        
+        # 对话气泡和情绪气泡：渲染结果缓存，显示时间由调度器管理
+        self.bubbles = BubbleOverlay(self, self.image_manager, self.animation_manager.scheduler,
+                                     self.animation_manager.task_key("bubble"))
+        
+        # 皮肤在后台加载完成并切换后刷新显示
+        self.image_manager.skin_loader.skin_loaded.connect(self.on_skin_loaded)
         
         # 设置初始位置
         self.set_initial_position()
         
+        # 万一平台没有发出绘制事件，稍后也要完成启动
+        QTimer.singleShot(500, self.finish_startup)
+        
         # 拖动相关变量
         self.dragging = False
         self.offset = QPoint()
         
+        # 这次按下后窗口是否真的被拖动过（只是点击时不在释放时打断点击、摸头或生气的动画）
+        self.drag_moved = False
+        
+        # 拖动时每个显示帧最多移动一次窗口，移动到最新的鼠标位置
+        self.drag_target = None
+        self.last_drag_move = 0.0
+        self.drag_interval = 1 / 60
+        self.drag_timer = QTimer(self)
+        self.drag_timer.setSingleShot(True)
+        self.drag_timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.drag_timer.timeout.connect(self.apply_drag_move)
+        
         # 接受拖放操作
         self.setAcceptDrops(True)
         
-        # 创建右键菜单
-        self.setup_context_menu()
+        # 右键菜单、设置对话框和食物盒在首次使用时才创建
+        self.context_menu = None
+        self.settings_dialog = None
+        self.food_helper = None
         
-        # 气泡和情绪气泡标签
-        self.bubble_label = None
-        self.emotion_bubble_label = None
+        # 食物拖放功能：拖放内容按食物表的索引匹配
+        self.food_registry = food_registry or FoodRegistry.from_file()
         
-        # 食物拖放功能
-        self.food_items = ["food_fish.png", "food_candy.png", "food_apple.png"]
-        
-        self.scale_factor = 1.0
+        self.scale_factor = self.image_manager.scale_factor
         self.show_emotions = True
         self.accept_food_drops = True
         self.enable_headpat = True
-
-        print("初始化完成")
+        
+        # 恢复保存的设置和心情，之后的改动合并后写回存档
+        self.restore_state()
+        
+        # 通过环境变量开启统计时同时显示浮层
+        if self.instrumentation.enabled:
+            self.set_instrumentation_enabled(True)
+        
+        logger.debug("初始化完成")
     
     def setup_window(self):
         """设置窗口属性"""
@@ -62,36 +127,131 @@ class PixelPet(QWidget):
         self.setAttribute(Qt.WidgetAttribute.WA_TranslucentBackground)
         self.setAttribute(Qt.WidgetAttribute.WA_NoSystemBackground)
     
-    def setup_label(self):
-        """设置显示标签"""
-        print("创建标签...")
-        self.label = QLabel(self)
-        self.label.setAttribute(Qt.WidgetAttribute.WA_TranslucentBackground)
+    def setup_canvas(self):
+        """设置绘制用的画布和初始图像"""
+        logger.debug("创建画布...")
+        # 当前精灵帧（气泡由 BubbleOverlay 管理）
+        self.sprite_pixmap = None
+        
+        # 精灵在窗口中的位置，上方和右侧留出气泡的空间
+        self.sprite_rect = QRect()
+        self.margin = QSize()
+        
+        # 合成好的缓存图像和其中需要重新合成的区域
+        self.backing = None
+        self.dirty_region = QRegion()
         
         # 加载初始图片
-        initial_pixmap = self.image_manager.load_image(self.image_manager.idle_images[0])
+        state_machine = self.image_manager.state_machine
+        initial_state = state_machine.state_names[state_machine.initial_state]
+        initial_pixmap = self.image_manager.get_frame(initial_state, 0)
         if initial_pixmap is None:
-            print("错误：无法加载初始图片")
+            logger.critical("无法加载初始图片")
             import sys
             sys.exit(1)
         else:
-            print(f"成功加载初始图片，尺寸: {initial_pixmap.width()}x{initial_pixmap.height()}")
-            
-        self.label.setPixmap(initial_pixmap)
-        self.resize(initial_pixmap.size())
+            logger.debug("成功加载初始图片，尺寸: %dx%d", initial_pixmap.width(), initial_pixmap.height())
+        
+        self.set_sprite(initial_pixmap)
+        
+        # 记录当前显示的帧，内容不变时跳过重绘
+        self.displayed_frame = self.image_manager.get_frame_key(initial_state, 0)
+    
+    def bubble_margin(self):
+        """窗口上方和右侧为气泡预留的空间"""
+        scale = self.image_manager.scale_factor
+        return QSize(int(80 * scale), int(60 * scale))
+    
+    def set_sprite(self, pixmap):
+        """更换精灵帧，只有精灵尺寸或气泡留白变化时才重新计算窗口几何"""
+        self.sprite_pixmap = pixmap
+        
+        # 帧图像可能带有 devicePixelRatio，窗口使用逻辑尺寸
+        # 缩放比例对齐后精灵尺寸可能不变，但气泡留白仍随缩放比例变化
+        size = pixmap.deviceIndependentSize().toSize()
+        margin = self.bubble_margin()
+        if size == self.sprite_rect.size() and margin == self.margin:
+            self.invalidate(self.sprite_rect)
+            return
+        
+        self.margin = margin
+        old_rect = self.sprite_rect
+        self.sprite_rect = QRect(QPoint(0, margin.height()), size)
+        self.resize(size.width() + margin.width(), size.height() + margin.height())
+        
+        # 保持精灵在屏幕上的位置不变
+        if not old_rect.isNull():
+            self.move(self.pos() + old_rect.topLeft() - self.sprite_rect.topLeft())
+        
+        self.backing = None
+        self.update()
+    
+    def invalidate(self, rect):
+        """标记需要重新合成和重绘的区域"""
+        if rect.isNull():
+            return
+        self.dirty_region = self.dirty_region.united(rect)
+        self.update(rect)
+    
+    def render_backing(self):
+        """把精灵和气泡合成到缓存图像中，只处理脏区域"""
+        # 窗口大小或所在屏幕的缩放比例变化时重建缓存图像，否则换到高分屏后会发虚
+        ratio = self.devicePixelRatioF()
+        if (self.backing is None or self.backing.devicePixelRatio() != ratio
+                or self.backing.deviceIndependentSize().toSize() != self.size()):
+            self.backing = QPixmap(self.size() * ratio)
+            self.backing.setDevicePixelRatio(ratio)
+            self.dirty_region = QRegion(self.rect())
+        if self.dirty_region.isEmpty():
+            return
+        
+        painter = QPainter(self.backing)
+        painter.setClipRegion(self.dirty_region)
+        painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_Source)
+        painter.fillRect(self.dirty_region.boundingRect(), Qt.GlobalColor.transparent)
+        painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_SourceOver)
         
-        # 设置窗口尺寸策略
-        self.label.adjustSize()
-        self.adjustSize()
+        if self.sprite_pixmap is not None:
+            painter.drawPixmap(self.sprite_rect.topLeft(), self.sprite_pixmap)
+        self.bubbles.paint(painter)
+        painter.end()
+        
+        self.dirty_region = QRegion()
+    
+    def paintEvent(self, event):
+        """把合成好的缓存图像画到窗口上，Qt 只会重绘 update() 标记的区域"""
+        with self.instrumentation.measure("paintEvent"):
+            self.render_backing()
+            painter = QPainter(self)
+            painter.setClipRegion(event.region())
+            painter.drawPixmap(0, 0, self.backing)
+            painter.end()
+        
+        # 首次绘制后再完成延后的初始化工作
+        if not self.startup_finished:
+            QTimer.singleShot(0, self.finish_startup)
+    
+    def finish_startup(self):
+        """首帧显示之后：记录首帧耗时并启动心情、睡眠和随机动画任务"""
+        if self.startup_finished:
+            return
+        self.startup_finished = True
+        self.time_to_first_frame_ms = (time.perf_counter() - self.startup_time) * 1000
+        logger.info("首帧耗时: %.1f ms", self.time_to_first_frame_ms)
+        
+        self.animation_manager.start_background_tasks()
     
     def setup_context_menu(self):
         """设置右键菜单"""
+        from PyQt6.QtWidgets import QMenu
+        from PyQt6.QtGui import QAction
+        
         self.context_menu = QMenu(self)
         
         # 切换皮肤选项
         self.skin_menu = QMenu("更换外观", self)
         for skin in self.image_manager.available_skins:
-            action = QAction(skin.capitalize(), self)
+            action = QAction(self.image_manager.skins.get(skin).display_name, self)
             action.triggered.connect(lambda checked, s=skin: self.change_skin(s))
             self.skin_menu.addAction(action)
         
@@ -108,9 +268,31 @@ class PixelPet(QWidget):
         self.context_menu.addAction(pet_action)
         
         talk_action = QAction("说话", self)
-        talk_action.triggered.connect(self.show_bubble)
+        talk_action.triggered.connect(self.say_something)
         self.context_menu.addAction(talk_action)
         
+        food_box_action = QAction("食物盒", self)
+        food_box_action.triggered.connect(self.show_food_helper)
+        self.context_menu.addAction(food_box_action)
+        
+        # 设置选项
+        self.context_menu.addSeparator()
+        settings_action = QAction("设置...", self)
+        settings_action.triggered.connect(self.show_settings)
+        self.context_menu.addAction(settings_action)
+        
+        # 性能监视选项
+        self.context_menu.addSeparator()
+        self.instrument_action = QAction("性能监视", self)
+        self.instrument_action.setCheckable(True)
+        self.instrument_action.setChecked(self.instrumentation.enabled)
+        self.instrument_action.toggled.connect(self.set_instrumentation_enabled)
+        self.context_menu.addAction(self.instrument_action)
+        
+        dump_action = QAction("导出性能数据", self)
+        dump_action.triggered.connect(self.dump_instrumentation)
+        self.context_menu.addAction(dump_action)
+        
         # 退出选项
         self.context_menu.addSeparator()
         exit_action = QAction("退出", self)
@@ -119,138 +301,310 @@ class PixelPet(QWidget):
     
     def set_initial_position(self):
         """设置窗口初始位置"""
-        # 设置初始位置在屏幕中央
-        screen = QApplication.primaryScreen().geometry()
-        center_pos = screen.center() - self.rect().center()
-        self.move(center_pos)
-        print(f"窗口位置设置为: x={center_pos.x()}, y={center_pos.y()}")
+        # 沿用上次保存的位置（保存的位置仍在某个屏幕上时），否则放在屏幕中央
+        position = self.state_store.get("position")
+        self.restored_position = False
+        if isinstance(position, list) and len(position) == 2 and all(isinstance(v, int) for v in position):
+            pos = QPoint(*position)
+            self.restored_position = QApplication.screenAt(pos + self.sprite_rect.center()) is not None
+        if not self.restored_position:
+            screen = QApplication.primaryScreen().geometry()
+            pos = screen.center() - self.rect().center()
+        self.move(pos)
+        logger.debug("窗口位置设置为: x=%d, y=%d", pos.x(), pos.y())
         
         # 确保窗口可见
         self.raise_()
         self.show()
-        print(f"窗口是否可见: {self.isVisible()}")
-        print(f"窗口大小: {self.width()}x{self.height()}")
+        logger.debug("窗口是否可见: %s, 窗口大小: %dx%d", self.isVisible(), self.width(), self.height())
     
     def update_image(self):
         """更新当前显示的图像"""
-        state = self.animation_manager.state
-        frame = self.animation_manager.current_frame
-        
-        # print(f"更新图片 - 当前状态: {state}, 帧: {frame}")
-        
-        image_path = self.image_manager.get_image_for_state(state, frame)
-        if image_path:
-            # 先清除当前图像
-            self.label.clear()
+        with self.instrumentation.measure("update_image"):
+            state = self.animation_manager.state
+            frame = self.animation_manager.current_frame
+            
+            # 显示的还是同一张图片（同皮肤、同文件、同缩放）时什么都不做
+            frame_key = self.image_manager.get_frame_key(state, frame)
+            if frame_key == self.displayed_frame:
+                return
             
-            pixmap = self.image_manager.load_image(image_path)
+            # 从帧缓存获取已缩放好的图像，避免每帧重复解码和缩放
+            pixmap = self.image_manager.get_frame(state, frame)
             if pixmap:
-                # 确保图像有透明背景
-                scaled_pixmap = pixmap.scaled(100, 100, Qt.AspectRatioMode.KeepAspectRatio)
-                self.label.setPixmap(scaled_pixmap)
-                self.resize(scaled_pixmap.size())
-                self.label.adjustSize()
-                self.adjustSize()
-                # print(f"图片更新成功: {image_path}")
+                self.set_sprite(pixmap)
+                self.displayed_frame = frame_key
+    
+    def hit_region(self, pos):
+        """窗口坐标所在的区域：透明、头部或身体（查询预先生成的点击区域）"""
+        animation_manager = self.animation_manager
+        mask = self.image_manager.get_hit_mask(animation_manager.state, animation_manager.current_frame)
+        if mask is not None:
+            return mask.region_at(pos, self.sprite_rect)
+        if not self.sprite_rect.contains(pos):
+            return TRANSPARENT
+        return HEAD if pos.y() < self.sprite_rect.y() + self.sprite_rect.height() * 0.4 else BODY
     
     def mousePressEvent(self, event):
         """鼠标按下事件处理"""
+        # 点在透明像素上时不处理，不会拖动窗口
+        region = self.hit_region(event.position().toPoint())
+        if region == TRANSPARENT:
+            event.ignore()
+            return
+        
         if event.button() == Qt.MouseButton.LeftButton:
-            self.dragging = True
-            self.offset = event.position().toPoint()
-            
-            # 设置点击状态
-            self.animation_manager.set_click_state()
+            with self.instrumentation.measure("mousePressEvent"):
+                self.dragging = True
+                self.drag_moved = False
+                self.offset = event.position().toPoint()
+                
+                # 按当前屏幕的刷新率确定窗口移动的最小间隔
+                screen = self.screen()
+                refresh_rate = screen.refreshRate() if screen else 0
+                self.drag_interval = 1 / refresh_rate if refresh_rate > 0 else 1 / 60
+                
+                # 设置点击状态，点在头部时摸头
+                self.animation_manager.set_click_state(region == HEAD)
         elif event.button() == Qt.MouseButton.RightButton:
-            # 显示右键菜单
+            # 显示右键菜单，第一次使用时才创建
+            if self.context_menu is None:
+                self.setup_context_menu()
             self.context_menu.exec(event.globalPosition().toPoint())
     
     def mouseMoveEvent(self, event):
         """鼠标移动事件处理"""
         if self.dragging:
+            with self.instrumentation.measure("mouseMoveEvent"):
+                # 只记录目标位置，窗口移动合并到下一个显示帧
+                self.drag_target = event.globalPosition().toPoint() - self.offset
+                if self.drag_timer.isActive():
+                    return
+                
+                wait = self.last_drag_move + self.drag_interval - time.perf_counter()
+                if wait <= 0:
+                    self.apply_drag_move()
+                else:
+                    self.drag_timer.start(max(1, round(wait * 1000)))
+    
+    def apply_drag_move(self):
+        """把窗口移动到最新的拖动位置"""
+        if self.drag_target is None:
+            return
+        with self.instrumentation.measure("apply_drag_move"):
+            self.last_drag_move = time.perf_counter()
+            
             # 切换到走路状态
+            self.drag_moved = True
             self.animation_manager.set_walk_state()
             
             # 移动窗口
-            self.move(event.globalPosition().toPoint() - self.offset)
+            self.move(self.drag_target)
+            self.drag_target = None
     
     def mouseReleaseEvent(self, event):
         """鼠标释放事件处理"""
         if event.button() == Qt.MouseButton.LeftButton:
-            self.dragging = False
-            
-            # 停止走路动画
-            self.animation_manager.stop_walk_animation()
-            
-            # 恢复闲置状态
-            self.animation_manager.restore_idle()
+            # 按下时点在透明像素上被忽略了，释放也不处理
+            if not self.dragging:
+                event.ignore()
+                return
+            with self.instrumentation.measure("mouseReleaseEvent"):
+                self.dragging = False
+                
+                # 立即应用还没执行的最后一次移动
+                self.drag_timer.stop()
+                self.apply_drag_move()
+                
+                # 保存新的窗口位置
+                self.schedule_save()
+                
+                # 拖动过才停止走路并恢复闲置，点击引起的一次性动画播放完后自己恢复
+                if self.drag_moved:
+                    self.drag_moved = False
+                    self.animation_manager.stop_walk_animation()
+                    self.animation_manager.restore_idle()
     
-    def show_bubble(self):
-        """显示对话气泡"""
-        if hasattr(self, "bubble_label") and self.bubble_label and self.bubble_label.isVisible():
-            self.bubble_label.hide()
-            return
-
-        bubble_pixmap = self.image_manager.load_image(self.image_manager.bubble_image)
-        if bubble_pixmap:
-            if not self.bubble_label:
-                self.bubble_label = QLabel(self)
-            self.bubble_label.setPixmap(bubble_pixmap)
-            self.bubble_label.move(self.width(), -30)  # 调整位置
-            self.bubble_label.show()
-            QTimer.singleShot(3000, self.bubble_label.hide)
-        else:
-            print("错误：无法加载气泡图片")
+    def say(self, text, duration_ms=3000, priority=0):
+        """用文字对话气泡说一句话"""
+        self.bubbles.show(SPEECH, self.bubbles.text_bubble(text), priority, duration_ms)
+    
+    def say_something(self):
+        """按当前心情随机说一句话"""
+        phrases = self.PHRASES.get(self.animation_manager.mood) or self.PHRASES["normal"]
+        self.say(random.choice(phrases))
     
     def show_emotion_bubble(self, emotion):
-        """显示情绪气泡"""
-        emotion_image = self.image_manager.get_emotion_bubble(emotion)
-        if not emotion_image:
+        """显示情绪气泡，设置中关闭情绪显示时不显示"""
+        if not self.show_emotions:
             return
-            
-        emotion_pixmap = self.image_manager.load_image(emotion_image)
+        emotion_pixmap = self.bubbles.emotion_bubble(emotion)
         if emotion_pixmap:
-            if not self.emotion_bubble_label:
-                self.emotion_bubble_label = QLabel(self)
-            self.emotion_bubble_label.setPixmap(emotion_pixmap)
-            self.emotion_bubble_label.move(self.width() - 10, -50)  # 调整位置
-            self.emotion_bubble_label.show()
-            QTimer.singleShot(2000, self.emotion_bubble_label.hide)
+            self.bubbles.show(EMOTION, emotion_pixmap, EMOTION_PRIORITY.get(emotion, DEFAULT_EMOTION_PRIORITY), 2000)
+    
+    def saved_scale_factor(self):
+        """存档中的缩放比例，超出设置范围时使用默认值"""
+        scale_factor = self.state_store.get("scale", 1.0)
+        if isinstance(scale_factor, (int, float)) and 0.5 <= scale_factor <= 1.5:
+            return float(scale_factor)
+        return 1.0
+    
+    def restore_state(self):
+        """从存档恢复设置和心情，并开始自动保存"""
+        store = self.state_store
+        settings = store.get("settings", {})
+        if isinstance(settings, dict):
+            self.show_emotions = bool(settings.get("show_emotions", self.show_emotions))
+            self.accept_food_drops = bool(settings.get("accept_food_drops", self.accept_food_drops))
+            self.enable_headpat = bool(settings.get("enable_headpat", self.enable_headpat))
+            self.animation_manager.special_animation_enabled = bool(
+                settings.get("special_animations", self.animation_manager.special_animation_enabled))
+            self.animation_manager.sleep_check_enabled = bool(
+                settings.get("sleep_check", self.animation_manager.sleep_check_enabled))
+        
+        last_interaction = store.get("last_interaction")
+        if not isinstance(last_interaction, (int, float)):
+            last_interaction = None
+        self.animation_manager.restore_mood(store.get("mood"), last_interaction)
+        
+        # 保存请求通过调度器合并，退出时再写一次
+        store.scheduler = self.animation_manager.scheduler
+        store.collect = self.collect_state
+        QApplication.instance().aboutToQuit.connect(store.flush)
+    
+    def collect_state(self):
+        """当前需要保存的状态"""
+        animation_manager = self.animation_manager
+        return {
+            "skin": self.image_manager.current_skin,
+            "scale": self.image_manager.scale_factor,
+            "mood": animation_manager.mood,
+            "last_interaction": round(animation_manager.last_interaction_timestamp(), 1),
+            "position": [self.x(), self.y()],
+            "settings": {
+                "special_animations": animation_manager.special_animation_enabled,
+                "sleep_check": animation_manager.sleep_check_enabled,
+                "show_emotions": self.show_emotions,
+                "accept_food_drops": self.accept_food_drops,
+                "enable_headpat": self.enable_headpat
+            }
+        }
+    
+    def schedule_save(self):
+        """请求保存存档，短时间内的多次请求合并为一次写入"""
+        self.state_store.schedule_save()
+    
+    def on_skin_loaded(self, *args):
+        """皮肤在后台加载完成并切换后刷新显示并保存"""
+        self.update_image()
+        self.schedule_save()
     
     def change_skin(self, skin_name):
-        """更换皮肤"""
-        if self.image_manager.set_skin(skin_name):
-            # 更新当前显示的图像
+        """更换皮肤，新皮肤在后台加载完成前继续显示当前皮肤"""
+        self.image_manager.preload_skin(skin_name)
+    
+    def set_instrumentation_enabled(self, enabled):
+        """开启或关闭性能统计和统计浮层"""
+        self.instrumentation.enabled = enabled
+        if enabled:
+            if self.instrumentation_overlay is None:
+                from instrumentation import InstrumentationOverlay
+                self.instrumentation_overlay = InstrumentationOverlay(self, self.instrumentation)
+            self.instrumentation_overlay.show()
+        elif self.instrumentation_overlay is not None:
+            self.instrumentation_overlay.hide()
+    
+    def dump_instrumentation(self):
+        """导出性能统计数据，路径可用环境变量 VPET_INSTRUMENT_FILE 指定"""
+        path = os.environ.get("VPET_INSTRUMENT_FILE") or os.path.expanduser("~/vpet_profile.json")
+        try:
+            self.instrumentation.dump(path)
+        except OSError as e:
+            logger.error("导出性能数据时出错: %s", e)
+    
+    def show_settings(self):
+        """打开设置对话框，第一次使用时才加载"""
+        if self.settings_dialog is None:
+            from settings_dialog import SettingsDialog
+            self.settings_dialog = SettingsDialog(self, self.image_manager)
+        self.settings_dialog.show()
+        self.settings_dialog.raise_()
+    
+    def show_food_helper(self):
+        """打开食物盒窗口，第一次使用时才加载"""
+        if self.food_helper is None:
+            from food_helper import FoodDragHelper
+            self.food_helper = FoodDragHelper(self.food_registry, self.image_manager.manifest)
+        self.food_helper.show()
+        self.food_helper.raise_()
+    
+    def set_scale(self, scale_factor):
+        """设置桌宠显示大小"""
+        self.scale_factor = scale_factor
+        if self.image_manager.set_scale_factor(scale_factor):
+            # 气泡按旧的大小渲染，直接收起
+            self.bubbles.clear()
             self.update_image()
+            self.schedule_save()
     
     def feed_pet(self):
-        """喂食"""
-        self.animation_manager.set_eating_state()
-        self.show_emotion_bubble("food")
+        """喂食（菜单中喂默认的食物）"""
+        self.eat([self.food_registry.default])
+    
+    def eat(self, foods):
+        """把食物放进进食队列依次吃掉，队列放不下时说一声"""
+        accepted = self.animation_manager.queue_food(foods)
+        logger.debug("吃: %s（接受 %d/%d 份）", ", ".join(food.name for food in foods), accepted, len(foods))
+        if accepted < len(foods):
+            self.say("吃不下了……")
+        return accepted
+    
+    def dropped_foods(self, mime_data, limit=None):
+        """拖放内容中的所有食物（最多 limit 份），同一份内容只按一种格式解析"""
+        registry = self.food_registry
+        
+        # 食物盒拖出的食物名、文件列表、文本（每行一个名字或路径）
+        if mime_data.hasFormat(FOOD_MIME_TYPE):
+            names = bytes(mime_data.data(FOOD_MIME_TYPE)).decode("utf-8").splitlines()
+            match = registry.get
+        elif mime_data.hasUrls():
+            names = [url.fileName() for url in mime_data.urls()]
+            match = registry.match
+        elif mime_data.hasText():
+            names = mime_data.text().splitlines()
+            match = registry.match
+        else:
+            names = []
+            match = None
+        
+        foods = []
+        for name in names:
+            food = match(name)
+            if food is not None:
+                foods.append(food)
+                if limit is not None and len(foods) >= limit:
+                    return foods
+        if foods:
+            return foods
+        
+        # 图片数据：按 MIME 类型匹配，算作一份
+        for mime_type in mime_data.formats():
+            food = registry.match_mime(mime_type)
+            if food is not None:
+                return [food]
+        return []
     
     # 拖放功能支持
     def dragEnterEvent(self, event: QDragEnterEvent):
-        """拖放进入事件"""
-        mime_data = event.mimeData()
-        
-        # 接受文件拖放
-        if mime_data.hasUrls():
-            for url in mime_data.urls():
-                file_name = url.fileName().lower()
-                # 检查是否为图片文件并且文件名符合食物项
-                if any(food in file_name for food in self.food_items) or file_name.endswith(('.png', '.jpg', '.jpeg', '.gif')):
-                    event.acceptProposedAction()
-                    return
-        
-        # 接受文本拖放（可能是表示食物的文本）
-        if mime_data.hasText():
-            text = mime_data.text().lower()
-            if any(food_name.lower() in text for food_name in ['fish', 'candy', 'apple', '鱼', '糖果', '苹果']):
-                event.acceptProposedAction()
-                return
+        """拖放进入事件：开启了食物拖放、进食队列没满并且内容是食物时接受"""
+        if (self.accept_food_drops and not self.animation_manager.eating_queue_full()
+                and self.dropped_foods(event.mimeData(), limit=1)):
+            event.acceptProposedAction()
     
     def dropEvent(self, event: QDropEvent):
-        """拖放事件处理"""
-        # 执行吃东西的动画
-        self.animation_manager.set_eating_state()
-        event.acceptProposedAction()
\ No newline at end of file
+        """拖放事件处理：拖来的食物排队吃掉"""
+        foods = self.dropped_foods(event.mimeData()) if self.accept_food_drops else []
+        if not foods or not self.eat(foods):
+            event.ignore()
+            return
+        event.acceptProposedAction()
@@ -0,0 +1,56 @@
+import time
+
+class RateTracker:
+    """滑动窗口内的事件频率统计
+
+    用环形缓冲区保存最近 capacity 个事件的单调时钟时间戳，记录事件是 O(1)，
+    查询时只跳过已经移出窗口的旧事件（均摊 O(1)）。缓冲区满时覆盖最旧的事件，
+    所以窗口内最多统计 capacity 个事件。
+    """
+    def __init__(self, window_s, capacity=32):
+        self.window = window_s
+        self.capacity = capacity
+        self.times = [0.0] * capacity
+        # start 指向最旧的事件，size 为窗口内（尚未清理）的事件数
+        self.start = 0
+        self.size = 0
+    
+    def add(self, now=None):
+        """记录一次事件"""
+        if now is None:
+            now = time.monotonic()
+        if self.size == self.capacity:
+            # 缓冲区已满，覆盖最旧的事件
+            self.start = (self.start + 1) % self.capacity
+            self.size -= 1
+        self.times[(self.start + self.size) % self.capacity] = now
+        self.size += 1
+    
+    def expire(self, now):
+        """丢弃已经移出窗口的事件"""
+        limit = now - self.window
+        while self.size and self.times[self.start] <= limit:
+            self.start = (self.start + 1) % self.capacity
+            self.size -= 1
+    
+    def count(self, now=None):
+        """窗口内的事件数"""
+        self.expire(time.monotonic() if now is None else now)
+        return self.size
+    
+    def rate(self, now=None):
+        """窗口内的平均频率（次/秒）"""
+        return self.count(now) / self.window
+    
+    def burst_rate(self, now=None):
+        """按窗口内事件实际跨越的时间计算的频率（次/秒），集中在一瞬间的事件频率更高；少于两个事件时为 0"""
+        if self.count(now) < 2:
+            return 0.0
+        newest = self.times[(self.start + self.size - 1) % self.capacity]
+        span = newest - self.times[self.start]
+        return (self.size - 1) / max(span, 0.001)
+    
+    def clear(self):
+        """清空所有事件"""
+        self.start = 0
+        self.size = 0
@@ -0,0 +1,150 @@
+import time
+import heapq
+import itertools
+from PyQt6.QtCore import QTimer
+from logger import get_logger
+
+logger = get_logger("scheduler")
+
+class ScheduledTask:
+    """调度器中的一个定时任务"""
+    def __init__(self, deadline, callback, key=None, interval=None):
+        self.deadline = deadline
+        self.callback = callback
+        self.key = key
+        self.interval = interval
+        self.cancelled = False
+
+class Scheduler:
+    """用一个单次 QTimer 驱动所有定时任务的最小堆调度器
+
+    任务可以随时取消；带 key 的任务同一时间只保留最新的一个。
+    到期时间相差不超过 slack_ms 的任务合并在同一次唤醒中执行。
+    """
+    def __init__(self, parent=None, slack_ms=20):
+        self.timer = QTimer(parent)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.run_due)
+        
+        self.slack = slack_ms / 1000.0
+        self.heap = []
+        self.tasks_by_key = {}
+        self.counter = itertools.count()
+        self.pending = 0
+        self.armed_deadline = None
+        
+        # 统计实际唤醒次数
+        self.wakeups = 0
+        
+        # 可选的观察者，用于统计每个任务的耗时和触发延迟
+        self.observer = None
+    
+    def call_later(self, delay_ms, callback, key=None, interval_ms=None):
+        """delay_ms 毫秒后执行 callback，带 key 时替换同 key 的旧任务"""
+        if key is not None:
+            self.cancel(key)
+        
+        deadline = time.monotonic() + delay_ms / 1000.0
+        interval = interval_ms / 1000.0 if interval_ms else None
+        task = ScheduledTask(deadline, callback, key, interval)
+        if key is not None:
+            self.tasks_by_key[key] = task
+        self.push(task)
+        return task
+    
+    def call_repeating(self, interval_ms, callback, key=None):
+        """每隔 interval_ms 毫秒执行一次 callback"""
+        return self.call_later(interval_ms, callback, key, interval_ms)
+    
+    def cancel(self, task_or_key):
+        """取消任务（可传任务对象或 key），返回是否确实取消了任务"""
+        if isinstance(task_or_key, ScheduledTask):
+            task = task_or_key
+        else:
+            task = self.tasks_by_key.get(task_or_key)
+        if task is None or task.cancelled:
+            return False
+        
+        task.cancelled = True
+        self.pending -= 1
+        if task.key is not None and self.tasks_by_key.get(task.key) is task:
+            del self.tasks_by_key[task.key]
+        
+        # 被取消的是最早到期的任务时，重新安排唤醒时间
+        if self.heap and self.heap[0][2] is task:
+            self.rearm()
+        return True
+    
+    def is_scheduled(self, key):
+        """指定 key 的任务是否在等待执行"""
+        return key in self.tasks_by_key
+    
+    def pending_count(self):
+        """等待执行的任务数量"""
+        return self.pending
+    
+    def push(self, task):
+        heapq.heappush(self.heap, (task.deadline, next(self.counter), task))
+        self.pending += 1
+        self.rearm()
+    
+    def rearm(self):
+        """让计时器在最早的未取消任务到期时唤醒"""
+        while self.heap and self.heap[0][2].cancelled:
+            heapq.heappop(self.heap)
+        
+        if not self.heap:
+            self.timer.stop()
+            self.armed_deadline = None
+            return
+        
+        deadline = self.heap[0][0]
+        if self.timer.isActive() and self.armed_deadline == deadline:
+            return
+        
+        delay = max(0, int((deadline - time.monotonic()) * 1000 + 0.999))
+        self.armed_deadline = deadline
+        self.timer.start(delay)
+    
+    def run_due(self):
+        """执行所有已到期（含 slack 范围内）的任务"""
+        self.wakeups += 1
+        self.armed_deadline = None
+        now = time.monotonic()
+        
+        due = []
+        while self.heap and self.heap[0][0] <= now + self.slack:
+            task = heapq.heappop(self.heap)[2]
+            if not task.cancelled:
+                due.append(task)
+        
+        for task in due:
+            # 前面的回调可能已经取消或替换了这个任务
+            if task.cancelled:
+                continue
+            
+            observer = self.observer
+            if observer is not None:
+                name = task.key[-1] if isinstance(task.key, tuple) else task.key
+                name = name or getattr(task.callback, "__name__", "task")
+                observer.record_lag(name, now - task.deadline)
+            
+            if task.interval:
+                task.deadline = max(task.deadline + task.interval, now)
+                heapq.heappush(self.heap, (task.deadline, next(self.counter), task))
+            else:
+                task.cancelled = True
+                self.pending -= 1
+                if task.key is not None and self.tasks_by_key.get(task.key) is task:
+                    del self.tasks_by_key[task.key]
+            
+            try:
+                if observer is not None:
+                    with observer.measure(name):
+                        task.callback()
+                else:
+                    task.callback()
+            except Exception as e:
+                logger.exception("定时任务执行出错: %s", e)
+        
+        self.rearm()
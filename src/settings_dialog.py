@@ -26,7 +26,7 @@ class SettingsDialog(QDialog):
         skin_label = QLabel("选择皮肤:")
         self.skin_combo = QComboBox()
         for skin in self.image_manager.available_skins:
-            self.skin_combo.addItem(skin.capitalize())
+            self.skin_combo.addItem(self.image_manager.skins.get(skin).display_name)
         
         # 设置当前选中的皮肤
         current_index = self.image_manager.available_skins.index(self.image_manager.current_skin)
@@ -56,12 +56,12 @@ class SettingsDialog(QDialog):
         
         # 自动动画设置
         self.enable_animations = QCheckBox("启用随机动画（眨眼/伸懒腰）")
-        self.enable_animations.setChecked(self.parent.animation_manager.special_animation_timer.isActive())
+        self.enable_animations.setChecked(self.parent.animation_manager.special_animation_enabled)
         behavior_layout.addWidget(self.enable_animations)
         
         # 睡眠设置
         self.enable_sleep = QCheckBox("启用睡眠模式（长时间不活动）")
-        self.enable_sleep.setChecked(self.parent.animation_manager.sleep_check_timer.isActive())
+        self.enable_sleep.setChecked(self.parent.animation_manager.sleep_check_enabled)
         behavior_layout.addWidget(self.enable_sleep)
         
         # 情绪设置
@@ -105,23 +105,15 @@ class SettingsDialog(QDialog):
         # 应用皮肤设置
         selected_skin = self.image_manager.available_skins[self.skin_combo.currentIndex()]
         if selected_skin != self.image_manager.current_skin:
-            self.image_manager.set_skin(selected_skin)
-            self.parent.update_image()
+            self.parent.change_skin(selected_skin)
         
         # 应用大小设置
         scale_factor = self.size_slider.value() / 100.0
         self.parent.set_scale(scale_factor)
         
         # 应用行为设置
-        if self.enable_animations.isChecked():
-            self.parent.animation_manager.special_animation_timer.start()
-        else:
-            self.parent.animation_manager.special_animation_timer.stop()
-            
-        if self.enable_sleep.isChecked():
-            self.parent.animation_manager.sleep_check_timer.start()
-        else:
-            self.parent.animation_manager.sleep_check_timer.stop()
+        self.parent.animation_manager.set_special_animation_enabled(self.enable_animations.isChecked())
+        self.parent.animation_manager.set_sleep_check_enabled(self.enable_sleep.isChecked())
             
         self.parent.show_emotions = self.enable_emotions.isChecked()
         
@@ -129,4 +121,7 @@ class SettingsDialog(QDialog):
         self.parent.accept_food_drops = self.enable_food.isChecked()
         self.parent.enable_headpat = self.enable_headpat.isChecked()
         
+        # 保存设置
+        self.parent.schedule_save()
+        
         self.accept()
\ No newline at end of file
@@ -0,0 +1,115 @@
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from PyQt6.QtGui import QImage
+from pixel_art import scale_sprite
+from hit_mask import HitMask
+from animated_sprite import AnimatedSprite
+from instrumentation import get_instrumentation
+
+class SkinLoadSignals(QObject):
+    """工作线程向主线程报告进度用的信号"""
+    progress = pyqtSignal(int, str, int, int)
+    finished = pyqtSignal(int, str, float, dict, dict, dict)
+
+class SkinLoadTask(QRunnable):
+    """在线程池中解码并缩放一个皮肤的全部帧，并扫描动画文件的帧数和帧时长"""
+    def __init__(self, generation, skin_name, frames, scale_factor, size, atlas=None, device_pixel_ratio=1.0,
+                 animations=None):
+        super().__init__()
+        self.generation = generation
+        self.skin_name = skin_name
+        self.frames = frames
+        # 文件名 -> 路径或图片数据
+        self.animations = animations or {}
+        self.scale_factor = scale_factor
+        self.size = size
+        self.device_pixel_ratio = device_pixel_ratio
+        self.signals = SkinLoadSignals()
+        
+        # 图集只传递路径和矩形，图集大图在工作线程中解码
+        self.atlas_path = atlas.image_path if atlas else None
+        self.atlas_frames = dict(atlas.frames) if atlas else {}
+        self.atlas_image = None
+    
+    def run(self):
+        # 工作线程中只能使用 QImage，QPixmap 必须在主线程创建
+        decoded = {}
+        images = {}
+        masks = {}
+        total = len(self.frames)
+        for index, (state, frame, image_name, path) in enumerate(self.frames):
+            # 同一文件在帧列表中可能出现多次，只解码一次
+            if image_name not in decoded:
+                decoded[image_name], mask = self.decode(image_name, path)
+                if mask is not None:
+                    masks[image_name] = mask
+            image = decoded[image_name]
+            if image is not None:
+                images[(state, frame)] = image
+            self.signals.progress.emit(self.generation, self.skin_name, index + 1, total)
+        
+        # 动画文件只在这里顺序读一遍帧时长，播放时再在主线程中逐帧解码
+        animations = {}
+        for file_name, source in self.animations.items():
+            animations[file_name] = AnimatedSprite(source)
+        
+        self.signals.finished.emit(self.generation, self.skin_name, self.scale_factor, images, masks, animations)
+    
+    def decode(self, image_name, path):
+        """解码并缩放单张图片（优先从图集中截取），同时生成原始图像的点击区域"""
+        image = None
+        rect = self.atlas_frames.get(image_name)
+        if rect is not None:
+            if self.atlas_image is None:
+                get_instrumentation().count("decode")
+                self.atlas_image = QImage(self.atlas_path)
+            if not self.atlas_image.isNull():
+                image = self.atlas_image.copy(rect)
+        
+        # path 是文件路径，zip 皮肤包中的图片则是已读出的数据
+        if image is None and path is not None:
+            get_instrumentation().count("decode")
+            image = QImage.fromData(path) if isinstance(path, bytes) else QImage(path)
+        if image is None or image.isNull():
+            return None, None
+        return scale_sprite(image, self.size, self.device_pixel_ratio), HitMask.from_image(image)
+
+class SkinLoader(QObject):
+    """后台皮肤加载器，只发布最近一次请求的加载结果"""
+    # 皮肤名, 已加载帧数, 总帧数
+    progress = pyqtSignal(str, int, int)
+    # 皮肤名, 缩放比例, {(状态, 帧): QImage}, {文件名: HitMask}, {动画文件名: AnimatedSprite}
+    skin_loaded = pyqtSignal(str, float, dict, dict, dict)
+    
+    def __init__(self, thread_pool=None):
+        super().__init__()
+        self.thread_pool = thread_pool or QThreadPool.globalInstance()
+        self.generation = 0
+        self.pending_skin = None
+        self.current_task = None
+    
+    def load(self, skin_name, frames, scale_factor, size, atlas=None, device_pixel_ratio=1.0, animations=None):
+        """开始加载皮肤，之前未完成的加载结果会被丢弃"""
+        self.generation += 1
+        self.pending_skin = skin_name
+        
+        task = SkinLoadTask(self.generation, skin_name, frames, scale_factor, size, atlas, device_pixel_ratio,
+                            animations)
+        task.signals.progress.connect(self.on_progress)
+        task.signals.finished.connect(self.on_finished)
+        self.current_task = task
+        self.thread_pool.start(task)
+    
+    def is_loading(self):
+        """是否有皮肤正在加载"""
+        return self.pending_skin is not None
+    
+    def on_progress(self, generation, skin_name, loaded, total):
+        if generation == self.generation:
+            self.progress.emit(skin_name, loaded, total)
+    
+    def on_finished(self, generation, skin_name, scale_factor, images, masks, animations):
+        if generation != self.generation:
+            return
+        self.pending_skin = None
+        self.current_task = None
+        self.skin_loaded.emit(skin_name, scale_factor, images, masks, animations)
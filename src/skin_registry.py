@@ -0,0 +1,209 @@
+import os
+import json
+import zipfile
+from collections import OrderedDict
+from logger import get_logger
+
+logger = get_logger("skin_registry")
+
+# 皮肤包中的描述文件
+SKIN_MANIFEST = "skin.json"
+DEFAULT_SKIN = "default"
+
+def default_skin_dirs(asset_dir):
+    """皮肤包搜索路径：环境变量 VPET_SKIN_PATH（用 os.pathsep 分隔），否则为资源目录下的 skins 和用户目录"""
+    value = os.environ.get("VPET_SKIN_PATH")
+    if value:
+        return [path for path in value.split(os.pathsep) if path]
+    return [os.path.join(asset_dir, "skins"),
+            os.path.join(os.path.expanduser("~"), ".local", "share", "vpet", "skins")]
+
+class Skin:
+    """一个皮肤
+
+    内置皮肤的帧是资源目录中带前缀的文件（hat_idle1.png）；皮肤包是一个目录或
+    zip 文件，根部有 skin.json（{"name": ..., "display_name": ...}），帧文件按
+    帧名命名（idle1.png）。皮肤包缺少的帧使用默认皮肤的图片。
+    包内的文件列表在第一次使用时才读取，unload() 后释放。
+    """
+    def __init__(self, name, display_name=None, prefix="", package=None):
+        self.name = name
+        self.display_name = display_name or name.capitalize()
+        self.prefix = prefix
+        self.package = package
+        
+        # 包内文件：小写文件名 -> 实际文件名，加载后才有
+        self.members = None
+        self.archive = None
+    
+    @property
+    def is_package(self):
+        return self.package is not None
+    
+    @property
+    def loaded(self):
+        return self.members is not None
+    
+    def image_name(self, frame):
+        """帧对应的图片文件名"""
+        return f"{self.prefix}{frame}.png"
+    
+    def fallback_name(self, image_name):
+        """本皮肤缺少该图片时使用的默认皮肤图片"""
+        if self.prefix and image_name.startswith(self.prefix):
+            return image_name[len(self.prefix):]
+        return image_name
+    
+    def load(self):
+        """读取皮肤包的文件列表（zip 保持打开直到 unload）"""
+        if not self.is_package or self.members is not None:
+            return
+        members = {}
+        try:
+            if zipfile.is_zipfile(self.package):
+                self.archive = zipfile.ZipFile(self.package)
+                for member in self.archive.namelist():
+                    if not member.endswith("/"):
+                        members[member.lower()] = member
+            else:
+                for root, _, files in os.walk(self.package):
+                    for file_name in files:
+                        relative = os.path.relpath(os.path.join(root, file_name), self.package)
+                        members[relative.replace(os.sep, "/").lower()] = relative
+        except (OSError, zipfile.BadZipFile) as e:
+            logger.error("无法读取皮肤包 %s: %s", self.package, e)
+        self.members = members
+        logger.info("已加载皮肤包: %s (%d 个文件)", self.name, len(members))
+    
+    def unload(self):
+        """释放皮肤包的文件列表和打开的 zip 文件"""
+        if self.archive is not None:
+            self.archive.close()
+            self.archive = None
+        if self.members is not None:
+            self.members = None
+            logger.info("已卸载皮肤包: %s", self.name)
+    
+    def has(self, image_name):
+        """皮肤包中是否有该图片（内置皮肤总是返回 False）"""
+        if not self.is_package:
+            return False
+        self.load()
+        return image_name.lower() in self.members
+    
+    def path(self, image_name):
+        """目录形式的皮肤包中图片的完整路径，zip 或没有该图片时为 None"""
+        if not self.has(image_name) or self.archive is not None:
+            return None
+        return os.path.join(self.package, self.members[image_name.lower()])
+    
+    def read(self, image_name):
+        """读取皮肤包中的图片数据，没有该图片时返回 None"""
+        if not self.has(image_name):
+            return None
+        member = self.members[image_name.lower()]
+        try:
+            if self.archive is not None:
+                return self.archive.read(member)
+            with open(os.path.join(self.package, member), "rb") as f:
+                return f.read()
+        except (OSError, KeyError, zipfile.BadZipFile) as e:
+            logger.error("无法读取皮肤图片 %s/%s: %s", self.name, image_name, e)
+            return None
+
+class SkinRegistry:
+    """皮肤注册表：启动时只读取皮肤的描述信息，皮肤包在第一次选中时才加载
+
+    除了正在使用的皮肤，最多保留 max_loaded 个最近用过的皮肤包，
+    更早的皮肤包会被卸载。
+    """
+    def __init__(self, manifest, frame_names, skin_dirs=None, max_loaded=3):
+        self.manifest = manifest
+        self.frame_names = set(frame_names)
+        self.skin_dirs = skin_dirs if skin_dirs is not None else default_skin_dirs(manifest.asset_dir)
+        self.max_loaded = max_loaded
+        
+        self.skins = {}
+        self.recent = OrderedDict()
+        self.scan()
+    
+    def scan(self):
+        """查找内置皮肤和皮肤包"""
+        self.skins = {DEFAULT_SKIN: Skin(DEFAULT_SKIN)}
+        
+        # 内置皮肤：资源目录中 "<皮肤名>_<帧名>.png" 形式的文件
+        for file_name in self.manifest.entries:
+            stem, ext = os.path.splitext(file_name.lower())
+            if ext != ".png" or "_" not in stem:
+                continue
+            prefix, frame = stem.split("_", 1)
+            if frame in self.frame_names and prefix not in self.skins:
+                self.skins[prefix] = Skin(prefix, prefix=f"{prefix}_")
+        
+        # 皮肤包：搜索路径下带 skin.json 的目录或 zip 文件
+        for skin_dir in self.skin_dirs:
+            try:
+                entries = sorted(os.scandir(skin_dir), key=lambda entry: entry.name)
+            except OSError:
+                continue
+            for entry in entries:
+                skin = self.read_package(entry)
+                if skin is None:
+                    continue
+                if skin.name in self.skins:
+                    logger.warning("忽略重名的皮肤包: %s", entry.path)
+                    continue
+                self.skins[skin.name] = skin
+        
+        logger.debug("可用皮肤: %s", ", ".join(self.names()))
+    
+    def read_package(self, entry):
+        """只读取皮肤包的 skin.json，不是皮肤包时返回 None"""
+        try:
+            if entry.is_dir():
+                manifest_path = os.path.join(entry.path, SKIN_MANIFEST)
+                if not os.path.isfile(manifest_path):
+                    return None
+                with open(manifest_path, "r", encoding="utf-8") as f:
+                    info = json.load(f)
+                default_name = entry.name
+            elif entry.name.lower().endswith(".zip"):
+                with zipfile.ZipFile(entry.path) as archive:
+                    info = json.loads(archive.read(SKIN_MANIFEST))
+                default_name = os.path.splitext(entry.name)[0]
+            else:
+                return None
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+            logger.error("无法读取皮肤包 %s: %s", entry.path, e)
+            return None
+        
+        if not isinstance(info, dict):
+            logger.error("皮肤包描述格式错误: %s", entry.path)
+            return None
+        name = str(info.get("name") or default_name).lower()
+        return Skin(name, info.get("display_name"), package=entry.path)
+    
+    def names(self):
+        """所有皮肤名，默认皮肤在最前"""
+        return [DEFAULT_SKIN] + sorted(name for name in self.skins if name != DEFAULT_SKIN)
+    
+    def get(self, name):
+        """按名称返回皮肤，没有时返回 None"""
+        return self.skins.get(name)
+    
+    def use(self, name):
+        """标记皮肤被使用（皮肤包在这时加载）"""
+        skin = self.skins.get(name)
+        if skin is None:
+            return
+        skin.load()
+        self.recent[name] = True
+        self.recent.move_to_end(name)
+    
+    def trim(self, in_use, max_loaded=None):
+        """卸载最久没用过的皮肤包，只保留 max_loaded 个不在使用中的皮肤包"""
+        limit = self.max_loaded if max_loaded is None else max_loaded
+        idle = [name for name in self.recent if name not in in_use]
+        for name in idle[:max(0, len(idle) - limit)]:
+            del self.recent[name]
+            self.skins[name].unload()
@@ -0,0 +1,144 @@
+import os
+import sys
+import json
+import math
+from PyQt6.QtGui import QImage, QPixmap, QPainter
+from PyQt6.QtCore import Qt, QRect
+from instrumentation import get_instrumentation
+from logger import get_logger
+
+logger = get_logger("sprite_atlas")
+
+ATLAS_VERSION = 1
+
+def atlas_index_name(skin_name):
+    """返回皮肤图集索引文件名"""
+    return f"{skin_name}_atlas.json"
+
+class SpriteAtlas:
+    """一个皮肤的图集：一张大图加上每帧在其中的矩形区域"""
+    def __init__(self, index_path):
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("version") != ATLAS_VERSION:
+            raise ValueError(f"不支持的图集版本: {index.get('version')}")
+        
+        self.skin_name = index["skin"]
+        self.image_path = os.path.join(os.path.dirname(index_path), index["image"])
+        self.frames = {name: QRect(*rect) for name, rect in index["frames"].items()}
+        
+        # 图集大图在第一次取帧时才解码
+        self.pixmap = None
+    
+    @classmethod
+    def find(cls, manifest, skin_name):
+        """在资源清单中查找并读取皮肤图集索引，没有图集时返回 None"""
+        index_path = manifest.resolve(atlas_index_name(skin_name))
+        if index_path is None:
+            return None
+        try:
+            return cls(index_path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.error("读取图集索引时出错: %s", e)
+            return None
+    
+    def has_frame(self, name):
+        return name in self.frames
+    
+    def get_pixmap(self, name):
+        """返回图集中某一帧的子图，图集本身只解码一次"""
+        rect = self.frames.get(name)
+        if rect is None:
+            return None
+        if self.pixmap is None:
+            get_instrumentation().count("decode")
+            self.pixmap = QPixmap(self.image_path)
+        if self.pixmap.isNull():
+            return None
+        return self.pixmap.copy(rect)
+
+def pack_skin(manifest, skin_name, frame_names, padding=2):
+    """把一个皮肤的所有帧打包成一张图集，并写出帧矩形索引"""
+    skin_prefix = "" if skin_name == "default" else f"{skin_name}_"
+    asset_dir = manifest.asset_dir
+    
+    # 读取所有不重复的帧，缺失的皮肤帧回退到默认皮肤图片
+    images = {}
+    for name in dict.fromkeys(frame_names):
+        path = manifest.resolve(name)
+        if path is None and skin_prefix:
+            path = manifest.resolve(name.replace(skin_prefix, "", 1))
+        image = QImage(path) if path else QImage()
+        if image.isNull():
+            logger.warning("找不到图片文件 %s，跳过", name)
+            continue
+        images[name] = image
+    
+    if not images:
+        logger.warning("皮肤 %s 没有可打包的图片", skin_name)
+        return None
+    
+    # 按高度排序后逐行（shelf）摆放
+    total_area = sum((img.width() + padding) * (img.height() + padding) for img in images.values())
+    max_width = max(img.width() + padding for img in images.values())
+    atlas_width = max(max_width, math.ceil(math.sqrt(total_area)))
+    
+    rects = {}
+    x = y = shelf_height = 0
+    for name, image in sorted(images.items(), key=lambda item: -item[1].height()):
+        if x + image.width() > atlas_width:
+            x = 0
+            y += shelf_height + padding
+            shelf_height = 0
+        rects[name] = (x, y, image.width(), image.height())
+        x += image.width() + padding
+        shelf_height = max(shelf_height, image.height())
+    atlas_height = y + shelf_height
+    
+    atlas = QImage(atlas_width, atlas_height, QImage.Format.Format_ARGB32_Premultiplied)
+    atlas.fill(Qt.GlobalColor.transparent)
+    painter = QPainter(atlas)
+    for name, (x, y, w, h) in rects.items():
+        painter.drawImage(x, y, images[name])
+    painter.end()
+    
+    image_name = f"{skin_name}_atlas.png"
+    if not atlas.save(os.path.join(asset_dir, image_name)):
+        logger.error("无法保存图集 %s", image_name)
+        return None
+    
+    index = {
+        "version": ATLAS_VERSION,
+        "skin": skin_name,
+        "image": image_name,
+        "frames": {name: list(rect) for name, rect in rects.items()}
+    }
+    index_path = os.path.join(asset_dir, atlas_index_name(skin_name))
+    with open(index_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, separators=(",", ":"))
+    
+    logger.info("已生成图集 %s: %d 帧, %dx%d", image_name, len(rects), atlas_width, atlas_height)
+    return index_path
+
+# 命令行打包工具: python sprite_atlas.py [资源目录] [皮肤名 ...]
+if __name__ == "__main__":
+    from PyQt6.QtGui import QGuiApplication
+    from image_manager import ImageManager
+    from state_machine import StateMachine
+    from asset_manifest import AssetManifest
+    from skin_registry import SkinRegistry
+    
+    app = QGuiApplication(sys.argv)
+    manifest = AssetManifest(os.path.abspath(sys.argv[1]) if len(sys.argv) > 1 else None)
+    state_machine = StateMachine.from_file()
+    registry = SkinRegistry(manifest, {frame for frames in state_machine.frame_names for frame in frames}, [])
+    
+    # 只打包资源目录中的内置皮肤，皮肤包自带图片
+    for skin in sys.argv[2:] or registry.names():
+        if registry.get(skin) is None:
+            logger.error("找不到皮肤: %s", skin)
+            continue
+        frame_names = []
+        for images in ImageManager.build_skin_images(registry.get(skin), state_machine).values():
+            frame_names.extend(images)
+        pack_skin(manifest, skin, frame_names)
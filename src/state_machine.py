@@ -0,0 +1,102 @@
+import os
+import json
+
+DEFAULT_DEFINITION = os.path.join(os.path.dirname(os.path.abspath(__file__)), "animations.json")
+
+class StateMachine:
+    """从定义文件编译而来的动画状态机
+
+    状态和事件在启动时编号，帧列表、帧时长和转换都存成按编号索引的表，
+    运行时的每一次查询都是一次列表下标访问。
+    """
+    def __init__(self, definition):
+        states = definition["states"]
+        
+        # 状态与事件编号
+        self.state_names = list(states)
+        self.state_ids = {name: index for index, name in enumerate(self.state_names)}
+        
+        event_names = []
+        for rule in definition.get("transitions", []):
+            if rule["event"] not in event_names:
+                event_names.append(rule["event"])
+        self.event_names = event_names
+        self.event_ids = {name: index for index, name in enumerate(event_names)}
+        
+        # 帧表
+        self.frame_names = []
+        self.frame_durations = []
+        self.frame_counts = []
+        self.looping = []
+        for name in self.state_names:
+            state = states[name]
+            frames = list(state["frames"])
+            if not frames:
+                raise ValueError(f"状态 {name} 没有任何帧")
+            
+            # 时长可以是单个数值（所有帧相同）或与帧一一对应的列表
+            durations = state.get("durations", 100)
+            if isinstance(durations, (int, float)):
+                durations = [durations] * len(frames)
+            if len(durations) != len(frames):
+                raise ValueError(f"状态 {name} 的帧时长数量与帧数不一致")
+            
+            self.frame_names.append(frames)
+            self.frame_durations.append([int(d) for d in durations])
+            self.frame_counts.append(len(frames))
+            self.looping.append(bool(state.get("loop", False)))
+        
+        # 转换表: transitions[状态][事件] = (目标状态, 条件名) 或 None
+        # 指定来源状态的规则优先于通配符 "*" 规则
+        self.transitions = [[None] * len(event_names) for _ in self.state_names]
+        rules = definition.get("transitions", [])
+        ordered = [r for r in rules if r["from"] == "*"] + [r for r in rules if r["from"] != "*"]
+        for rule in ordered:
+            event_id = self.event_ids[rule["event"]]
+            target = rule.get("to")
+            if target is not None and target not in self.state_ids:
+                raise ValueError(f"转换目标状态不存在: {target}")
+            entry = (self.state_ids[target], rule.get("guard")) if target is not None else None
+            
+            if rule["from"] == "*":
+                sources = range(len(self.state_names))
+            elif rule["from"] in self.state_ids:
+                sources = [self.state_ids[rule["from"]]]
+            else:
+                raise ValueError(f"转换来源状态不存在: {rule['from']}")
+            for state_id in sources:
+                self.transitions[state_id][event_id] = entry
+        
+        self.initial_state = self.state_ids[definition.get("initial", self.state_names[0])]
+        
+        # 闲置时随机触发的事件（眨眼、伸懒腰等）
+        self.random_events = [e for e in definition.get("random_events", []) if e in self.event_ids]
+    
+    @classmethod
+    def from_file(cls, path=DEFAULT_DEFINITION):
+        """读取并编译状态机定义文件"""
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+    
+    def next_state(self, state_id, event, guards=None):
+        """查询事件触发后的目标状态编号，事件无效或条件不满足时返回 None
+
+        guards 是使用方提供的条件函数，例如 {"headpat_enabled": lambda: True}，
+        状态机本身不保存任何运行时状态，可以被多只桌宠共用。
+        """
+        event_id = self.event_ids.get(event)
+        if event_id is None:
+            return None
+        entry = self.transitions[state_id][event_id]
+        if entry is None:
+            return None
+        target, guard = entry
+        if guard is not None:
+            check = guards.get(guard) if guards else None
+            if check is None or not check():
+                return None
+        return target
+    
+    def frame_duration(self, state_id, frame):
+        """返回某状态某一帧的显示时长（毫秒）"""
+        return self.frame_durations[state_id][frame % self.frame_counts[state_id]]
@@ -0,0 +1,107 @@
+import os
+import json
+from logger import get_logger
+
+logger = get_logger("state_store")
+
+# 存档格式版本，格式变化时加一并在 MIGRATIONS 中登记升级函数
+STATE_VERSION = 1
+
+# 版本号 -> 把该版本的存档升级到下一版本的函数
+MIGRATIONS = {}
+
+def default_state_path(index=0):
+    """存档文件路径：环境变量 VPET_STATE_FILE 或 ~/.config/vpet/state.json，多只桌宠各用一个文件"""
+    path = os.environ.get("VPET_STATE_FILE") or os.path.join(os.path.expanduser("~"), ".config", "vpet", "state.json")
+    if index:
+        root, ext = os.path.splitext(path)
+        path = f"{root}-{index}{ext}"
+    return path
+
+def migrate(data):
+    """把旧版本的存档逐级升级到当前版本，无法识别的存档当作空存档"""
+    version = data.get("version", 0)
+    while version < STATE_VERSION:
+        upgrade = MIGRATIONS.get(version)
+        if upgrade is None:
+            logger.warning("无法升级存档版本 %s，使用默认设置", version)
+            return {"version": STATE_VERSION}
+        data = upgrade(data)
+        version += 1
+        data["version"] = version
+    if version > STATE_VERSION:
+        logger.warning("存档版本 %s 比程序新，使用默认设置", version)
+        return {"version": STATE_VERSION}
+    return data
+
+class StateStore:
+    """桌宠存档：第一次读取时才加载，保存请求在 delay_ms 内合并为一次写入
+
+    写入时调用 collect() 取得当前状态，所以频繁的改动（例如拖动）只会
+    在到期时写一次；内容没有变化时不写盘。先写临时文件再原子地替换，
+    写到一半崩溃也不会损坏旧存档。
+    """
+    def __init__(self, path=None, scheduler=None, delay_ms=2000):
+        self.path = path or default_state_path()
+        self.scheduler = scheduler
+        self.delay_ms = delay_ms
+        
+        # 返回当前状态字典的回调，由桌宠设置
+        self.collect = None
+        
+        self.data = None
+        self.saved_text = None
+    
+    def load(self):
+        """读取存档（只读一次），文件不存在或损坏时返回空存档"""
+        if self.data is not None:
+            return self.data
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.saved_text = f.read()
+            data = json.loads(self.saved_text)
+            if not isinstance(data, dict):
+                raise ValueError("存档不是对象")
+            self.data = migrate(data)
+        except OSError:
+            self.data = {"version": STATE_VERSION}
+        except ValueError as e:
+            logger.warning("存档文件损坏，使用默认设置: %s", e)
+            self.data = {"version": STATE_VERSION}
+        return self.data
+    
+    def get(self, key, default=None):
+        """读取存档中的一项"""
+        return self.load().get(key, default)
+    
+    def schedule_save(self):
+        """请求保存，已有待写入的请求时直接合并"""
+        if self.scheduler is None:
+            return
+        key = ("state_store", self.path)
+        if not self.scheduler.is_scheduled(key):
+            self.scheduler.call_later(self.delay_ms, self.flush, key=key)
+    
+    def flush(self):
+        """立即写入当前状态，内容没有变化时跳过，返回是否写了文件"""
+        data = self.load()
+        if self.collect is not None:
+            data.update(self.collect())
+        data["version"] = STATE_VERSION
+        
+        text = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+        if text == self.saved_text:
+            return False
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error("无法写入存档: %s", e)
+            return False
+        self.saved_text = text
+        return True